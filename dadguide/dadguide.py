@@ -6,22 +6,34 @@ Access via the exported DadGuide sqlite database.
 Don't hold on to any of the dastructures exported from here, or the
 entire database could be leaked when the module is reloaded.
 """
+import array
 import asyncio
+import bisect
+import concurrent.futures
+import copy
 import csv
 import difflib
+import glob
+import hashlib
+import heapq
 import json
+import math
 import os
+import pickle
 import re
 import shutil
 import sqlite3 as lite
+import sys
 import traceback
+import urllib.request
 from _collections import defaultdict, deque, OrderedDict
+from collections import Counter
 from datetime import datetime
 from enum import Enum
 
+import numpy as np
 import pytz
 import romkan
-from __main__ import send_cmd_help
 from discord.ext import commands
 
 from . import rpadutils
@@ -45,7 +57,28 @@ PANTHNAME_FILE_PATTERN = CSV_FILE_PATTERN.format('panthnames')
 
 DB_DUMP_URL = 'https://f002.backblazeb2.com/file/dadguide-data/db/dadguide.sqlite'
 DB_DUMP_FILE = 'data/dadguide/dadguide.sqlite'
-DB_DUMP_WORKING_FILE = 'data/dadguide/dadguide_working.sqlite'
+DB_DUMP_WORKING_PATTERN = 'data/dadguide/dadguide_working_{}.sqlite'
+DB_DUMP_VERSION_PATTERN = 'data/dadguide/dadguide_v{}.sqlite'
+DB_MMAP_SIZE = 512 * 1024 * 1024
+
+DEFAULT_MONSTER_CACHE_SIZE = 2000
+
+# How long commands still holding monsters from a replaced database get before it's closed
+OLD_DATABASE_CLOSE_DELAY_SECS = 10 * 60
+
+# Bump this whenever MonsterIndex/NamedMonster change shape, to ignore old pickles
+INDEX_CACHE_VERSION = 11
+INDEX_CACHE_PATTERN = 'data/dadguide/index_{}.pickle'
+
+# Minimum similarity (difflib ratio) for the close nickname/name fallbacks of find_monster
+DEFAULT_NICKNAME_FUZZY_CUTOFF = .8
+DEFAULT_NAME_FUZZY_CUTOFF = .9
+
+# Shared by the NamedMonsters without override nicknames, most of them
+NO_NICKNAMES = frozenset()
+
+# ァ-ヶ to ぁ-ゖ, for comparing JP names regardless of which kana they're written in
+KATAKANA_TO_HIRAGANA = {c: c - 0x60 for c in range(0x30A1, 0x30F7)}
 
 
 class Dadguide(object):
@@ -67,9 +100,25 @@ class Dadguide(object):
         # Map of google-translated JP names to EN names
         self.translated_names = {}
 
-        self.database = load_database(None)
+        # Empty until reload_data_task builds the first snapshot
+        self.database = DadguideDatabase(monster_cache_size=self.settings.monsterCacheSize())
         self.index = None
 
+        # Snapshot builds take seconds, so they get their own worker instead of queueing up everyone
+        # else's work on rpadutils' shared one. One worker, so builds never overlap.
+        self.build_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+        # Batch lookups, so they don't wait behind a build either
+        self.lookup_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        # Bumped every time a freshly built database/index snapshot is swapped in
+        self.generation = 0
+
+        # Hash of the files the current snapshot was built from; see compute_index_cache_key
+        self.index_cache_key = None
+
+        # Databases that were swapped out but aren't closed yet; see _swap_snapshot
+        self.retired_databases = []
+
     @asyncio.coroutine
     def wait_until_ready(self):
         """Wait until the Dadguide cog is ready.
@@ -79,13 +128,34 @@ class Dadguide(object):
         """
         yield from self._is_ready.wait()
 
-    def create_index(self, accept_filter=None):
-        """Exported function that allows a client cog to create a monster index"""
-        return MonsterIndex(self.database,
-                            self.nickname_overrides,
-                            self.basename_overrides,
-                            self.panthname_overrides,
-                            accept_filter=accept_filter)
+    def create_index(self, named_monster_filter=None):
+        """Exported function that allows a client cog to get a monster index
+
+        Everyone shares the index built with the current snapshot. If named_monster_filter is
+        set, you get a view of it restricted to the monsters the filter accepts. Unlike the
+        accept_filter this used to take, it's called with each NamedMonster, not a DgMonster;
+        NamedMonster has on_na/on_jp/on_kr, rarity, series and the names to filter on.
+        """
+        index = self.index
+        if index is None:
+            index = MonsterIndex(self.database,
+                                 self.nickname_overrides,
+                                 self.basename_overrides,
+                                 self.panthname_overrides)
+        return index.view(named_monster_filter) if named_monster_filter else index
+
+    async def find_monsters(self, queries, named_monster_filter=None, in_executor=False):
+        """Exported function that allows a client cog to resolve several monster queries at once
+
+        Returns {query: (NamedMonster, err, debug_info)} like MonsterIndex.find_monsters,
+        searching the index create_index(named_monster_filter) gives. Big batches can be run on
+        the executor so they don't hold up the event loop.
+        """
+        index = self.create_index(named_monster_filter)
+        if in_executor:
+            return await rpadutils.run_in_loop(self.bot, index.find_monsters, queries,
+                                               executor=self.lookup_executor)
+        return index.find_monsters(queries)
 
     def get_monster_by_no(self, monster_no: int):
         """Exported function that allows a client cog to get a full PgMonster by monster_no"""
@@ -100,13 +170,23 @@ class Dadguide(object):
             self.database.close()
         self.database = None
         self._is_ready.clear()
+        self.build_executor.shutdown(wait=False)
+        self.lookup_executor.shutdown(wait=False)
 
     async def reload_data_task(self):
         await self.bot.wait_until_ready()
 
-        # We already had a copy of the database at startup, signal that we're ready now.
-        if self.database.has_database():
+        # We already had a copy of the database at startup, load it and signal that we're ready now.
+        if os.path.exists(DB_DUMP_FILE):
             print('Using stored database at load')
+            try:
+                # Usually just loads the index saved by the last run
+                snapshot = await rpadutils.run_in_loop(self.bot, self._build_snapshot,
+                                                       executor=self.build_executor)
+                self._swap_snapshot(*snapshot)
+            except Exception as ex:
+                print("dadguide stored snapshot load failed", ex)
+                traceback.print_exc()
             self._is_ready.set()
 
         while self == self.bot.get_cog('Dadguide'):
@@ -136,43 +216,98 @@ class Dadguide(object):
 
     async def download_and_refresh_nicknames(self):
         if self.settings.dataFile():
-            shutil.copy2(self.settings.dataFile(), DB_DUMP_FILE)
+            await rpadutils.run_in_loop(self.bot, copy_file_atomically, self.settings.dataFile(),
+                                        DB_DUMP_FILE, executor=self.build_executor)
         else:
             await self._download_files()
         await self._download_override_files()
 
-        nickname_overrides = self._csv_to_tuples(NICKNAME_FILE_PATTERN)
-        basename_overrides = self._csv_to_tuples(BASENAME_FILE_PATTERN)
-        panthname_overrides = self._csv_to_tuples(PANTHNAME_FILE_PATTERN)
-
-        self.nickname_overrides = {x[0].lower(): int(x[1])
-                                   for x in nickname_overrides if x[1].isdigit()}
-
-        self.basename_overrides = defaultdict(set)
-        for x in basename_overrides:
-            k, v = x
-            if k.isdigit():
-                self.basename_overrides[int(k)].add(v.lower())
-
-        self.panthname_overrides = {x[0].lower(): x[1].lower() for x in panthname_overrides}
-        self.panthname_overrides.update({v: v for _, v in self.panthname_overrides.items()})
-
-        self.database = load_database(self.database)
-        self.index = MonsterIndex(self.database, self.nickname_overrides, self.basename_overrides,
-                                  self.panthname_overrides)
-
-        self.write_monster_computed_names()
-
-    def write_monster_computed_names(self):
+        # Nothing to rebuild if the current snapshot was built from these exact files, and opened
+        # the way the settings say to
+        index_cache_key = await rpadutils.run_in_loop(
+            self.bot, lambda: compute_index_cache_key(rpadutils.cached_file_hash(DB_DUMP_FILE)),
+            executor=self.build_executor)
+        if (index_cache_key is not None and index_cache_key == self.index_cache_key
+                and self.database.immutable == self.settings.immutableDb()):
+            print('dadguide data unchanged, keeping current snapshot')
+            return
+
+        # Everything below is slow, so build the new snapshot off the event loop. Commands keep
+        # using the current database/index until the new one is swapped in.
+        snapshot = await rpadutils.run_in_loop(self.bot, self._build_snapshot,
+                                               executor=self.build_executor)
+        self._swap_snapshot(*snapshot)
+
+    def _build_snapshot(self):
+        nickname_overrides, basename_overrides, panthname_overrides = load_override_files(
+            NICKNAME_FILE_PATTERN, BASENAME_FILE_PATTERN, PANTHNAME_FILE_PATTERN)
+
+        database = load_database(self.settings.immutableDb(), self.settings.monsterCacheSize())
+
+        database_hash = hash_files([database.data_file]) if database.data_file else None
+        index_cache_key = compute_index_cache_key(database_hash)
+        index = load_cached_index('dadguide', index_cache_key) if index_cache_key else None
+        if index is None:
+            prev_index = self.index
+            if (database_hash and prev_index is not None
+                    and prev_index.database_hash == database_hash):
+                # Only the override sheets changed, patch the groups they touch
+                index = prev_index.with_overrides(database, nickname_overrides, basename_overrides,
+                                                  panthname_overrides)
+            else:
+                index = MonsterIndex(database, nickname_overrides, basename_overrides,
+                                     panthname_overrides)
+            index.database_hash = database_hash
+            if index_cache_key:
+                save_cached_index('dadguide', index_cache_key, index)
+
+        self.write_monster_computed_names(index)
+
+        return (database, index, nickname_overrides, basename_overrides, panthname_overrides,
+                index_cache_key)
+
+    def _swap_snapshot(self, database, index, nickname_overrides, basename_overrides,
+                       panthname_overrides, index_cache_key):
+        # Must run on the event loop; there are no awaits here so readers never see a partial swap.
+        # Anything still holding the previous database keeps working until it is closed, a while
+        # after the swap.
+        old_database = self.database
+        self.nickname_overrides = nickname_overrides
+        self.basename_overrides = basename_overrides
+        self.panthname_overrides = panthname_overrides
+        index.nickname_fuzzy_cutoff = self.settings.nicknameFuzzyCutoff()
+        index.name_fuzzy_cutoff = self.settings.nameFuzzyCutoff()
+
+        self.database = database
+        self.index = index
+        self.index_cache_key = index_cache_key
+        self.generation += 1
+
+        if old_database is not None and old_database is not database:
+            self.retired_databases.append(old_database)
+            self.bot.loop.call_later(OLD_DATABASE_CLOSE_DELAY_SECS,
+                                     self._close_retired_database, old_database)
+
+    def _close_retired_database(self, database):
+        database.close()
+        self.retired_databases.remove(database)
+        # Copies of the database can only be deleted once nothing has them open. Both kinds are
+        # cleaned up either way, so toggling immutable_db doesn't leave the other kind behind.
+        open_databases = self.retired_databases + [self.database]
+        open_files = [d.data_file for d in open_databases if d is not None]
+        remove_stale_database_files(DB_DUMP_WORKING_PATTERN, open_files)
+        remove_stale_database_files(DB_DUMP_VERSION_PATTERN, open_files)
+
+    def write_monster_computed_names(self, index):
         results = {}
-        for name, nm in self.index.all_entries.items():
+        for name, nm in index.all_entries.items():
             results[name] = int(rpadutils.get_pdx_id_dadguide(nm))
 
         with open(NAMES_EXPORT_PATH, 'w', encoding='utf-8') as f:
             json.dump(results, f, sort_keys=True)
 
         results = {}
-        for nm in self.index.all_monsters:
+        for nm in index.all_monsters:
             entry = {'bn': list(nm.group_basenames)}
             if nm.extra_nicknames:
                 entry['nn'] = list(nm.extra_nicknames)
@@ -181,25 +316,6 @@ class Dadguide(object):
         with open(BASENAMES_EXPORT_PATH, 'w', encoding='utf-8') as f:
             json.dump(results, f, sort_keys=True)
 
-    def _csv_to_tuples(self, file_path: str, cols: int = 2):
-        # Loads a two-column CSV into an array of tuples.
-        results = []
-        with open(file_path, encoding='utf-8') as f:
-            file_reader = csv.reader(f, delimiter=',')
-            for row in file_reader:
-                if len(row) < 2:
-                    continue
-
-                data = [None] * cols
-                for i in range(0, min(cols, len(row))):
-                    data[i] = row[i].strip()
-
-                if not len(data[0]):
-                    continue
-
-                results.append(data)
-        return results
-
     async def _download_files(self):
         one_hour_secs = 1 * 60 * 60
         await rpadutils.async_cached_dadguide_request(DB_DUMP_FILE, DB_DUMP_URL, one_hour_secs)
@@ -218,6 +334,8 @@ class Dadguide(object):
     async def dadguide(self, ctx):
         """Dadguide database settings"""
         if ctx.invoked_subcommand is None:
+            # Imported here so the index code also loads outside the bot, e.g. in tools/
+            from __main__ import send_cmd_help
             await send_cmd_help(ctx)
 
     @dadguide.command(pass_context=True)
@@ -227,11 +345,52 @@ class Dadguide(object):
         self.settings.setDataFile(data_file)
         await self.bot.say(inline('Done'))
 
+    @dadguide.command(pass_context=True)
+    @checks.is_owner()
+    async def toggleimmutabledb(self, ctx):
+        """Toggle opening the downloaded database read-only and memory-mapped."""
+        new_setting = not self.settings.immutableDb()
+        self.settings.setImmutableDb(new_setting)
+        await self.bot.say(inline(
+            'immutable_db set to {}, takes effect on the next refresh.'.format(new_setting)))
+
+    @dadguide.command(pass_context=True)
+    @checks.is_owner()
+    async def setmonstercachesize(self, ctx, size: int):
+        """Set how many monsters get_monster keeps built (0 to disable)."""
+        if size < 0:
+            await self.bot.say(inline('Cache size must be at least 0'))
+            return
+        self.settings.setMonsterCacheSize(size)
+        cache = self.database.monster_cache
+        old_hit_rate = cache.hit_rate()
+        cache.resize(size)
+        await self.bot.say(inline('Monster cache size set to {} (hit rate so far {:.1%})'.format(
+            size, old_hit_rate)))
+
+    @dadguide.command(pass_context=True)
+    @checks.is_owner()
+    async def setfuzzycutoffs(self, ctx, nickname_cutoff: float, name_cutoff: float):
+        """Set the minimum similarity (0-1) for close nickname/name matches in ^id."""
+        if not (0 < nickname_cutoff <= 1 and 0 < name_cutoff <= 1):
+            await self.bot.say(inline('Cutoffs must be between 0 and 1'))
+            return
+        self.settings.setNicknameFuzzyCutoff(nickname_cutoff)
+        self.settings.setNameFuzzyCutoff(name_cutoff)
+        if self.index:
+            self.index.nickname_fuzzy_cutoff = nickname_cutoff
+            self.index.name_fuzzy_cutoff = name_cutoff
+        await self.bot.say(inline('Done'))
+
 
 class DadguideSettings(CogSettings):
     def make_default_settings(self):
         config = {
             'data_file': '',
+            'immutable_db': False,
+            'monster_cache_size': DEFAULT_MONSTER_CACHE_SIZE,
+            'nickname_fuzzy_cutoff': DEFAULT_NICKNAME_FUZZY_CUTOFF,
+            'name_fuzzy_cutoff': DEFAULT_NAME_FUZZY_CUTOFF,
         }
         return config
 
@@ -242,6 +401,34 @@ class DadguideSettings(CogSettings):
         self.bot_settings['data_file'] = data_file
         self.save_settings()
 
+    def immutableDb(self):
+        return self.bot_settings['immutable_db']
+
+    def setImmutableDb(self, immutable_db):
+        self.bot_settings['immutable_db'] = immutable_db
+        self.save_settings()
+
+    def monsterCacheSize(self):
+        return self.bot_settings['monster_cache_size']
+
+    def setMonsterCacheSize(self, monster_cache_size):
+        self.bot_settings['monster_cache_size'] = monster_cache_size
+        self.save_settings()
+
+    def nicknameFuzzyCutoff(self):
+        return self.bot_settings['nickname_fuzzy_cutoff']
+
+    def setNicknameFuzzyCutoff(self, cutoff):
+        self.bot_settings['nickname_fuzzy_cutoff'] = cutoff
+        self.save_settings()
+
+    def nameFuzzyCutoff(self):
+        return self.bot_settings['name_fuzzy_cutoff']
+
+    def setNameFuzzyCutoff(self, cutoff):
+        self.bot_settings['name_fuzzy_cutoff'] = cutoff
+        self.save_settings()
+
 
 def setup(bot):
     n = Dadguide(bot)
@@ -295,36 +482,501 @@ class Server(Enum):
     KR = 2
 
 
+class Acquisition(object):
+    """Bits of DgMonster.acquisition.
+
+    The *_EVO bits are set when any monster in the evolution tree has the matching bit.
+    """
+    FARMABLE = 1 << 0
+    PEM = 1 << 1
+    REM = 1 << 2
+    MP_SHOP = 1 << 3
+
+    EVO_SHIFT = 4
+    FARMABLE_EVO = FARMABLE << EVO_SHIFT
+    PEM_EVO = PEM << EVO_SHIFT
+    REM_EVO = REM << EVO_SHIFT
+    MP_SHOP_EVO = MP_SHOP << EVO_SHIFT
+
+
 class DadguideTableNotFound(Exception):
     def __init__(self, table_name):
         self.message = '{} not found'.format(table_name)
 
 
-def load_database(existing_db):
-    # Release the handle to the database file if it has one
-    if existing_db:
-        existing_db.close()
-    # Overwrite the working copy so we can open a handle to it without affecting future downloads
-    if os.path.exists(DB_DUMP_FILE):
-        shutil.copy2(DB_DUMP_FILE, DB_DUMP_WORKING_FILE)
-    # Open the new working copy.
-    return DadguideDatabase(data_file=DB_DUMP_WORKING_FILE)
+def copy_file_atomically(src, dst):
+    # Copy next to the destination and rename it into place, so anything holding the old
+    # dst (an open sqlite handle, or a hard link to it) never sees a half-written file.
+    tmp_dst = dst + '.tmp'
+    shutil.copy2(src, tmp_dst)
+    os.replace(tmp_dst, dst)
+
+
+def csv_to_tuples(file_path: str, cols: int = 2):
+    # Loads a two-column CSV into an array of tuples.
+    results = []
+    with open(file_path, encoding='utf-8') as f:
+        file_reader = csv.reader(f, delimiter=',')
+        for row in file_reader:
+            if len(row) < 2:
+                continue
+
+            data = [None] * cols
+            for i in range(0, min(cols, len(row))):
+                data[i] = row[i].strip()
+
+            if not len(data[0]):
+                continue
+
+            results.append(data)
+    return results
+
+
+def load_override_files(nickname_file, basename_file, panthname_file):
+    """Parse the override sheets into nickname, basename and panthname overrides."""
+    nickname_rows = csv_to_tuples(nickname_file)
+    basename_rows = csv_to_tuples(basename_file)
+    panthname_rows = csv_to_tuples(panthname_file)
+
+    nickname_overrides = {x[0].lower(): int(x[1])
+                          for x in nickname_rows if x[1].isdigit()}
+
+    basename_overrides = defaultdict(set)
+    for x in basename_rows:
+        k, v = x
+        if k.isdigit():
+            basename_overrides[int(k)].add(v.lower())
+
+    panthname_overrides = {x[0].lower(): x[1].lower() for x in panthname_rows}
+    panthname_overrides.update({v: v for _, v in panthname_overrides.items()})
+
+    return nickname_overrides, basename_overrides, panthname_overrides
+
+
+def load_database(immutable=False, monster_cache_size=DEFAULT_MONSTER_CACHE_SIZE):
+    if immutable:
+        return load_immutable_database(monster_cache_size)
+    if not os.path.exists(DB_DUMP_FILE):
+        return DadguideDatabase(monster_cache_size=monster_cache_size)
+    # Make a working copy so we can open a handle to it without affecting future downloads. Each
+    # download gets its own, so the one the current snapshot has open is never replaced.
+    working_file = DB_DUMP_WORKING_PATTERN.format(os.stat(DB_DUMP_FILE).st_mtime_ns)
+    if not os.path.exists(working_file):
+        copy_file_atomically(DB_DUMP_FILE, working_file)
+    return DadguideDatabase(data_file=working_file, monster_cache_size=monster_cache_size)
+
+
+def load_immutable_database(monster_cache_size=DEFAULT_MONSTER_CACHE_SIZE):
+    """Open the downloaded database in place instead of copying it.
+
+    Downloads always replace DB_DUMP_FILE rather than rewriting it, so a hard link to the
+    current file is a stable, versioned name for it that the next download won't touch.
+    """
+    if not os.path.exists(DB_DUMP_FILE):
+        return DadguideDatabase(monster_cache_size=monster_cache_size)
+    version_file = DB_DUMP_VERSION_PATTERN.format(os.stat(DB_DUMP_FILE).st_mtime_ns)
+    if not os.path.exists(version_file):
+        try:
+            os.link(DB_DUMP_FILE, version_file)
+        except OSError:
+            # Filesystem without hard links
+            copy_file_atomically(DB_DUMP_FILE, version_file)
+    return DadguideDatabase(data_file=version_file, immutable=True,
+                            monster_cache_size=monster_cache_size)
+
+
+def remove_stale_database_files(file_pattern, keep_files):
+    """Delete the copies of the database named like file_pattern, except for keep_files."""
+    keep_files = {os.path.abspath(f) for f in keep_files if f}
+    for data_file in glob.glob(file_pattern.format('*')):
+        if os.path.abspath(data_file) in keep_files:
+            continue
+        try:
+            os.remove(data_file)
+        except OSError as ex:
+            print('failed to remove old dadguide database', data_file, ex)
+
+
+def hash_files(file_paths):
+    """sha256 of the contents of file_paths, or None if any of them doesn't exist."""
+    if not all(os.path.exists(f) for f in file_paths):
+        return None
+    h = hashlib.sha256()
+    for file_path in file_paths:
+        with open(file_path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1024 * 1024), b''):
+                h.update(chunk)
+    return h.hexdigest()
+
+
+def compute_index_cache_key(database_hash):
+    """Key everything a MonsterIndex is built from: the database and the override sheets.
+
+    Returns None if there is nothing to key on yet.
+    """
+    # Usually read from the metadata saved when the sheets were downloaded
+    override_files = (NICKNAME_FILE_PATTERN, BASENAME_FILE_PATTERN, PANTHNAME_FILE_PATTERN)
+    overrides_hashes = [rpadutils.cached_file_hash(f) for f in override_files]
+    if database_hash is None or None in overrides_hashes:
+        return None
+    return hashlib.sha256(''.join([database_hash] + overrides_hashes).encode()).hexdigest()
+
+
+def load_cached_index(cache_name, cache_key):
+    file_path = INDEX_CACHE_PATTERN.format(cache_name)
+    if not os.path.exists(file_path):
+        return None
+    try:
+        with open(file_path, 'rb') as f:
+            version, key, index = pickle.load(f)
+    except Exception as ex:
+        print('failed to load cached index', file_path, ex)
+        return None
+    if version != INDEX_CACHE_VERSION or key != cache_key:
+        return None
+    return index
+
+
+def save_cached_index(cache_name, cache_key, index):
+    file_path = INDEX_CACHE_PATTERN.format(cache_name)
+    tmp_file_path = file_path + '.tmp'
+    try:
+        with open(tmp_file_path, 'wb') as f:
+            pickle.dump((INDEX_CACHE_VERSION, cache_key, index), f, pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_file_path, file_path)
+    except Exception as ex:
+        print('failed to save cached index', file_path, ex)
+
+
+class StatTable(object):
+    """HP/ATK/RCV curves for every monster, so stats for the whole catalog are a few array ops.
+
+    Results match DgMonster.stat exactly; the float math is done in the same order, and
+    np.rint rounds halves to even like round() does.
+    """
+    STAT_KEYS = ('hp', 'atk', 'rcv')
+    PLUS_VALUES = np.array([10, 5, 3])
+    INHERIT_MULTS = np.array([0.10, 0.05, 0.15])
+    CACHE_SIZE = 32
+
+    def __init__(self, monster_rows):
+        rows = list(monster_rows.values())
+        self.monster_ids = np.array(list(monster_rows.keys()), dtype=np.int64)
+        self._idx_by_monster = {monster_id: i for i, monster_id in enumerate(monster_rows)}
+
+        self.level = np.array([r['level'] for r in rows], dtype=np.int64)
+        self.limit_mult = np.array([r['limit_mult'] for r in rows], dtype=np.int64)
+        # monsters x (hp, atk, rcv)
+        self.min = np.array([[r[k + '_min'] for k in self.STAT_KEYS] for r in rows],
+                            dtype=np.float64)
+        self.max = np.array([[r[k + '_max'] for k in self.STAT_KEYS] for r in rows],
+                            dtype=np.float64)
+        self.scale = np.array([[r[k + '_scale'] for k in self.STAT_KEYS] for r in rows],
+                              dtype=np.float64)
+        self.min.shape = self.max.shape = self.scale.shape = (len(rows), len(self.STAT_KEYS))
+
+        # (lv, plus, inherit, is_plus_297) -> (hp, atk, rcv, weighted) arrays
+        self._stats_cache = rpadutils.LruCache(self.CACHE_SIZE)
+
+    def stats(self, lv=99, plus=0, inherit=False):
+        """Same arguments as DgMonster.stats, but returns arrays indexed like monster_ids.
+
+        The arrays are cached and shared, so they're read-only.
+        """
+        is_plus_297 = False
+        if plus == 297:
+            plus = (99, 99, 99)
+            is_plus_297 = True
+        elif plus == 0:
+            plus = (0, 0, 0)
+        key = (lv, tuple(plus), inherit, is_plus_297)
+        result = self._stats_cache.get(key)
+        if result is None:
+            result = self._compute_stats(lv, plus, inherit, is_plus_297)
+            self._stats_cache.put(key, result)
+        return result
+
+    def _compute_stats(self, lv, plus, inherit, is_plus_297):
+        # Level 1 max monsters divide by zero here; np.where below drops those rows
+        with np.errstate(divide='ignore', invalid='ignore'):
+            progress = (np.minimum(lv, self.level) - 1) / (self.level - 1)
+            s_val = self.min + (self.max - self.min) * progress[:, np.newaxis] ** self.scale
+        s_val = np.where((self.level > 1)[:, np.newaxis], s_val, self.min)
+        if lv > 99:
+            s_val *= (1 + (self.limit_mult / 11 * (lv - 99)) / 100)[:, np.newaxis]
+        plus_values = self.PLUS_VALUES * np.clip(plus, 0, 99)
+        s_val += plus_values
+        if inherit:
+            if not is_plus_297:
+                s_val -= plus_values
+            s_val *= self.INHERIT_MULTS
+
+        hp, atk, rcv = np.rint(s_val).astype(np.int64).T
+        weighted = np.rint(hp / 10 + atk / 5 + rcv / 3).astype(np.int64)
+        result = hp, atk, rcv, weighted
+        for a in result:
+            a.setflags(write=False)
+        return result
+
+    def monster_stats(self, monster_id: int, lv=99, plus=0, inherit=False):
+        idx = self._idx_by_monster[monster_id]
+        return tuple(int(a[idx]) for a in self.stats(lv, plus, inherit))
+
+    def monster_ids_with_min_stats(self, lv=99, hp=None, atk=None, rcv=None, weighted=None):
+        """Ids of monsters with at least the given stats at lv, in table order."""
+        mask = np.ones(len(self.monster_ids), dtype=bool)
+        for values, min_value in zip(self.stats(lv=lv), (hp, atk, rcv, weighted)):
+            if min_value is not None:
+                mask &= values >= min_value
+        return self.monster_ids[mask].tolist()
 
 
 class DadguideDatabase(object):
-    def __init__(self, data_file=None):
+    def __init__(self, data_file=None, immutable=False,
+                 monster_cache_size=DEFAULT_MONSTER_CACHE_SIZE):
         self._con = None
+        self.data_file = data_file
+        self.immutable = immutable
+
+        # Identity map of built monsters. It belongs to this snapshot, so loading a new
+        # database throws the whole thing away along with the old one.
+        self.monster_cache = rpadutils.LruCache(monster_cache_size)
+
+        # In-memory snapshot of the tables needed to build a DgMonster; see _load_snapshot.
+        # Monsters are kept as tuples of their column values, in _monster_class order.
+        self._monster_values = OrderedDict()
+        self._awakenings_by_monster = defaultdict(list)
+        self._prev_evolution_by_monster = {}
+        self._next_evolutions_by_monster = defaultdict(list)
+        self._active_skills = {}
+        self._leader_skills = {}
+        # Parsed once per skill for MonsterSearchHelper
+        self._active_skill_features = {}
+        self._leader_skill_search_texts = {}
+        self._awoken_skills = {}
+        self._series = {}
+        # monster_id -> Acquisition bits; see _build_acquisition_flags
+        self._acquisition_by_monster = {}
+
+        # Reverse maps for the embeds that list related monsters; see _build_reverse_maps
+        self._evolutions_by_material = defaultdict(list)
+        self._monster_ids_by_active = defaultdict(list)
+        self._monster_ids_by_series = defaultdict(list)
+        self._drop_dungeons_by_monster = defaultdict(list)
+
+        # Every monster's stat curves; see StatTable
+        self.stat_table = None
+
+        # (item class, column names) -> slotted record class; see make_record_class
+        self._record_classes = {}
+        self._monster_class = None
+
+        # Evolution tree closure; see _build_evolution_closure
+        self._base_monster_id_by_monster = {}
+        self._evolution_tree_ids = OrderedDict()
+        self._evolution_depth_by_monster = {}
 
         if data_file is not None:
-            self._con = lite.connect(data_file, detect_types=lite.PARSE_DECLTYPES)
+            # Snapshots are built in a worker thread and then read from the event loop
+            if immutable:
+                # Read-only with no locking or change detection; pages are memory-mapped
+                # straight from the file and shared with any other process that maps it.
+                uri = 'file:{}?mode=ro&immutable=1'.format(
+                    urllib.request.pathname2url(os.path.abspath(data_file)))
+                self._con = lite.connect(uri, uri=True, detect_types=lite.PARSE_DECLTYPES,
+                                         check_same_thread=False)
+                self._con.execute('PRAGMA mmap_size={}'.format(DB_MMAP_SIZE))
+            else:
+                self._con = lite.connect(data_file, detect_types=lite.PARSE_DECLTYPES,
+                                         check_same_thread=False)
             self._con.row_factory = lite.Row
+            self._load_snapshot()
 
     def has_database(self):
         return self._con is not None
 
+    def _load_snapshot(self):
+        """Read every table backing DgMonster once and join them in memory.
+
+        Building a DgMonster used to fire a cascade of single-row queries (awakenings,
+        each step of the evolution chain, skills, series). Full scans of each table are
+        much cheaper than that, so get_monster/get_all_monsters are served from here.
+        """
+        self._load_record_classes()
+
+        cursor = self._con.cursor()
+        cursor.execute(self._select_builder(tables={DgMonster.TABLE: DgMonster.FIELDS}))
+        self._monster_class = self._record_class(DgMonster, cursor.description)
+        monster_rows = OrderedDict((row[DgMonster.PK], row) for row in cursor.fetchall())
+        self.stat_table = StatTable(monster_rows)
+        # The sqlite3.Rows are only needed while building the snapshot
+        self._monster_values = OrderedDict((k, tuple(row)) for k, row in monster_rows.items())
+
+        for a in self._scan_table(DgAwakening):
+            self._awakenings_by_monster[a.monster_id].append(a)
+        for awakenings in self._awakenings_by_monster.values():
+            awakenings.sort(key=lambda a: a.order_idx)
+
+        for e in self._scan_table(DgEvolution):
+            # Mirror the fetchone() semantics of the old per-monster query
+            self._prev_evolution_by_monster.setdefault(e.to_id, e)
+            self._next_evolutions_by_monster[e.from_id].append(e)
+            # An evolution needing several of one material is still listed once for it
+            mat_ids = (e['mat_{}_id'.format(i)] for i in range(1, 6))
+            for mat_id in OrderedDict.fromkeys(m_id for m_id in mat_ids if m_id is not None):
+                self._evolutions_by_material[mat_id].append(e)
+
+        self._active_skills = {x.key(): x for x in self._scan_table(DgActiveSkill)}
+        self._leader_skills = {x.key(): x for x in self._scan_table(DgLeaderSkill)}
+        self._active_skill_features = {k: ActiveSkillSearchFeatures(x)
+                                       for k, x in self._active_skills.items()}
+        self._leader_skill_search_texts = {k: leader_skill_search_text(x)
+                                           for k, x in self._leader_skills.items()}
+        self._awoken_skills = {x.key(): x for x in self._scan_table(DgAwokenSkill)}
+        self._series = {x.key(): x for x in self._scan_table(DgSeries)}
+
+        self._build_evolution_closure()
+        farmable_monster_ids = self._build_drop_dungeons()
+        self._build_acquisition_flags(monster_rows, farmable_monster_ids)
+        self._build_reverse_maps(monster_rows)
+
+    def _load_record_classes(self):
+        """Generate the slotted record class for each table from its schema."""
+        for d_type in (DgMonster, DgAwakening, DgEvolution, DgActiveSkill, DgLeaderSkill,
+                       DgAwokenSkill, DgSeries, DgDungeon, DgEncounter, DgDrop, DgScheduledEvent):
+            try:
+                fields, _ = self._get_table_fields(d_type.TABLE)
+            except DadguideTableNotFound:
+                continue
+            self._record_classes[(d_type, tuple(fields))] = make_record_class(d_type, fields)
+
+    def _record_class(self, d_type, description):
+        """Get the record class for rows of d_type with the columns in a cursor description.
+
+        Full table selects hit the classes generated from the schema; anything else (joins,
+        partial selects) gets a class generated for its columns on first use.
+        """
+        fields = tuple(c[0] for c in description)
+        record_class = self._record_classes.get((d_type, fields))
+        if record_class is None:
+            record_class = make_record_class(d_type, fields)
+            self._record_classes[(d_type, fields)] = record_class
+        return record_class
+
+    def _build_evolution_closure(self):
+        """Compute every evolution tree once, instead of walking evolutions per monster.
+
+        Fills in base_id -> tree ids (in the same BFS order that get_evolution_tree_ids has
+        always returned), and monster_id -> base_id and depth in its tree.
+        """
+        from_ids = set(self._next_evolutions_by_monster.keys())
+        to_ids = set(self._prev_evolution_by_monster.keys())
+        base_ids = (from_ids - to_ids) | (set(self._monster_values.keys()) - from_ids - to_ids)
+
+        for base_id in sorted(base_ids):
+            evolution_tree = [base_id]
+            n_evos = deque()
+            n_evos.append(base_id)
+            while len(n_evos) > 0:
+                n_evo_id = n_evos.popleft()
+                for e in self._next_evolutions_by_monster.get(n_evo_id, []):
+                    n_evos.append(e.to_id)
+                    evolution_tree.append(e.to_id)
+            self._evolution_tree_ids[base_id] = evolution_tree
+
+        # A monster can be in several trees when it evolves from more than one monster. Its
+        # base is the one DgMonster has always found: follow the first evolution into each
+        # monster (see _prev_evolution_by_monster) until there are none.
+        for monster_id in sorted(set(self._monster_values.keys()) | to_ids):
+            path = []
+            base_id = monster_id
+            while base_id not in self._base_monster_id_by_monster:
+                prev_evolution = self._prev_evolution_by_monster.get(base_id)
+                if prev_evolution is None or base_id in path:
+                    # A root, or an evolution cycle with no root
+                    self._base_monster_id_by_monster[base_id] = base_id
+                    self._evolution_depth_by_monster[base_id] = 0
+                    break
+                path.append(base_id)
+                base_id = prev_evolution.from_id
+            root_id = self._base_monster_id_by_monster[base_id]
+            depth = self._evolution_depth_by_monster[base_id]
+            for m_id in reversed(path):
+                depth += 1
+                self._base_monster_id_by_monster[m_id] = root_id
+                self._evolution_depth_by_monster[m_id] = depth
+
+    def _build_acquisition_flags(self, monster_rows, farmable_monster_ids):
+        """Work out how every monster and evolution tree can be acquired, in one pass.
+
+        Each monster gets its own Acquisition bits from the drops table and its monster row,
+        plus the *_EVO bits of everything in its evolution tree.
+        """
+        for monster_id, row in monster_rows.items():
+            flags = 0
+            if monster_id in farmable_monster_ids:
+                flags |= Acquisition.FARMABLE
+            if row['pal_egg'] == 1:
+                flags |= Acquisition.PEM
+            if row['rem_egg'] == 1:
+                flags |= Acquisition.REM
+            if row['buy_mp'] is not None:
+                flags |= Acquisition.MP_SHOP
+            self._acquisition_by_monster[monster_id] = flags
+
+        for evolution_tree in self._evolution_tree_ids.values():
+            tree_flags = 0
+            for m_id in evolution_tree:
+                tree_flags |= self._acquisition_by_monster.get(m_id, 0)
+            tree_flags <<= Acquisition.EVO_SHIFT
+            for m_id in evolution_tree:
+                if m_id in self._acquisition_by_monster:
+                    self._acquisition_by_monster[m_id] |= tree_flags
+
+    def _build_reverse_maps(self, monster_rows):
+        """Index monsters by active skill and series.
+
+        Lists are in table order, which is what the queries they replace returned.
+        """
+        for monster_id, row in monster_rows.items():
+            # Like the '=?' queries these replace, NULL matches nothing
+            if row['active_skill_id'] is not None:
+                self._monster_ids_by_active[row['active_skill_id']].append(monster_id)
+            if row['series_id'] is not None:
+                self._monster_ids_by_series[row['series_id']].append(monster_id)
+
+    def _build_drop_dungeons(self):
+        """Index dungeons by the monsters they drop, in one pass over the drops table.
+
+        Returns the ids of every monster that drops anywhere, for _build_acquisition_flags.
+        """
+        dungeons = OrderedDict((d.dungeon_id, d) for d in self._scan_table(DgDungeon))
+        dungeon_order = {dungeon_id: i for i, dungeon_id in enumerate(dungeons)}
+        encounter_dungeon_ids = {x.encounter_id: x.dungeon_id
+                                 for x in self._scan_table(DgEncounter)}
+        farmable_monster_ids = set()
+        for drop in self._scan_table(DgDrop):
+            farmable_monster_ids.add(drop.monster_id)
+            dungeon = dungeons.get(encounter_dungeon_ids.get(drop.encounter_id))
+            if dungeon is not None:
+                self._drop_dungeons_by_monster[drop.monster_id].append(dungeon)
+        for drop_dungeons in self._drop_dungeons_by_monster.values():
+            # The order the join they replace returned them in
+            drop_dungeons.sort(key=lambda d: dungeon_order[d.dungeon_id])
+        return farmable_monster_ids
+
+    def _scan_table(self, d_type):
+        return self._query_many(
+            self._select_builder(tables={d_type.TABLE: d_type.FIELDS}),
+            (),
+            d_type,
+            as_generator=True)
+
     def close(self):
-        self._con.close()
-        self._con = None
+        # Can be called again by a deferred close after the cog unloads
+        if self._con is not None:
+            self._con.close()
+            self._con = None
 
     @staticmethod
     def _select_builder(tables, key=None, where=None, order=None, distinct=False):
@@ -365,7 +1017,7 @@ class DadguideDatabase(object):
         res = cursor.fetchone()
         if res is not None:
             if issubclass(d_type, DadguideItem):
-                return d_type(res, self)
+                return self._record_class(d_type, cursor.description)(res, self)
             else:
                 return d_type(res)
         return None
@@ -373,8 +1025,9 @@ class DadguideDatabase(object):
     def _as_generator(self, cursor, d_type):
         res = cursor.fetchone()
         if issubclass(d_type, DadguideItem):
+            record_class = self._record_class(d_type, cursor.description)
             while res is not None:
-                yield d_type(res, self)
+                yield record_class(res, self)
                 res = cursor.fetchone()
         else:
             while res is not None:
@@ -389,10 +1042,16 @@ class DadguideDatabase(object):
         if as_generator:
             return self._as_generator(cursor, d_type)
         else:
+            if issubclass(d_type, DadguideItem):
+                record_class = self._record_class(d_type, cursor.description)
+                make_item = lambda res: record_class(res, self)
+            else:
+                make_item = d_type
             if idx_key is None:
-                return [d_type(res, self) for res in cursor.fetchall()]
+                return [make_item(res) for res in cursor.fetchall()]
             else:
-                return DictWithAttrAccess({res[idx_key]: d_type(res, self) for res in cursor.fetchall()})
+                return DictWithAttrAccess({res[idx_key]: make_item(res)
+                                           for res in cursor.fetchall()})
 
     def _select_one_entry_by_pk(self, pk, d_type):
         return self._query_one(
@@ -416,13 +1075,19 @@ class DadguideDatabase(object):
         return fields, pk
 
     def get_active_skill(self, active_skill_id: int):
-        return self._select_one_entry_by_pk(active_skill_id, DgActiveSkill)
+        return self._active_skills.get(active_skill_id)
 
     def get_leader_skill(self, leader_skill_id: int):
-        return self._select_one_entry_by_pk(leader_skill_id, DgLeaderSkill)
+        return self._leader_skills.get(leader_skill_id)
+
+    def get_active_skill_features(self, active_skill_id: int):
+        return self._active_skill_features.get(active_skill_id, NO_ACTIVE_SKILL_FEATURES)
+
+    def get_leader_skill_search_text(self, leader_skill_id: int):
+        return self._leader_skill_search_texts.get(leader_skill_id, '')
 
     def get_awoken_skill(self, awoken_skill_id):
-        return self._select_one_entry_by_pk(awoken_skill_id, DgAwokenSkill)
+        return self._awoken_skills.get(awoken_skill_id)
 
     def get_awoken_skill_ids(self):
         SELECT_AWOKEN_SKILL_IDS = 'SELECT awoken_skill_id from awoken_skills'
@@ -443,111 +1108,65 @@ class DadguideDatabase(object):
             DgMonster)
 
     def get_awakenings_by_monster(self, monster_id, is_super=None):
+        awakenings = self._awakenings_by_monster.get(monster_id, [])
         if is_super is None:
-            where = '{0}.monster_id=?'.format(DgAwakening.TABLE)
-            param = (monster_id,)
-        else:
-            where = '{0}.monster_id=? AND {0}.is_super=?'.format(DgAwakening.TABLE)
-            param = (monster_id, is_super)
-        return self._query_many(
-            self._select_builder(
-                tables={DgAwakening.TABLE: DgAwakening.FIELDS},
-                where=where,
-                order='order_idx ASC'
-            ),
-            param,
-            DgAwakening)
+            return list(awakenings)
+        return [a for a in awakenings if a.is_super == bool(is_super)]
 
     def get_drop_dungeons(self, monster_id):
-        return self._query_many(
-            self._select_builder(
-                tables=OrderedDict({
-                    DgDungeon.TABLE: DgDungeon.FIELDS,
-                    DgEncounter.TABLE: None,
-                    DgDrop.TABLE: None,
-                }),
-                where='{0}.monster_id=?'.format(DgDrop.TABLE),
-                key=(DgDungeon.PK, DgEncounter.PK)
-            ),
-            (monster_id,),
-            DgDungeon)
+        return list(self._drop_dungeons_by_monster.get(monster_id, []))
+
+    def get_acquisition(self, monster_id):
+        return self._acquisition_by_monster.get(monster_id, 0)
 
     def monster_is_farmable(self, monster_id):
-        return self._query_one(
-            self._select_builder(
-                tables={DgDrop.TABLE: DgDrop.FIELDS},
-                where='{0}.monster_id=?'.format(DgDrop.TABLE)
-            ),
-            (monster_id,),
-            DgDrop) is not None
+        return bool(self.get_acquisition(monster_id) & Acquisition.FARMABLE)
 
     def monster_in_rem(self, monster_id):
-        return self._query_one(
-            self._select_builder(
-                tables={DgMonster.TABLE: ('rem_egg',)},
-                where='{0}.monster_id=? AND rem_egg=1'.format(DgMonster.TABLE)
-            ),
-            (monster_id,),
-            DgDrop) is not None
+        return bool(self.get_acquisition(monster_id) & Acquisition.REM)
 
     def monster_in_pem(self, monster_id):
-        return self._query_one(
-            self._select_builder(
-                tables={DgMonster.TABLE: ('pal_egg',)},
-                where='{0}.monster_id=? AND pal_egg=1'.format(DgMonster.TABLE)
-            ),
-            (monster_id,),
-            DgDrop) is not None
+        return bool(self.get_acquisition(monster_id) & Acquisition.PEM)
 
     def monster_in_mp_shop(self, monster_id):
-        return self._query_one(
-            self._select_builder(
-                tables={DgMonster.TABLE: ('buy_mp',)},
-                where='{0}.monster_id=? AND buy_mp IS NOT NULL'.format(DgMonster.TABLE)
-            ),
-            (monster_id,),
-            DgDrop) is not None
+        return bool(self.get_acquisition(monster_id) & Acquisition.MP_SHOP)
 
     def get_prev_evolution_by_monster(self, monster_id):
-        return self._query_one(
-            self._select_builder(
-                tables={DgEvolution.TABLE: DgEvolution.FIELDS},
-                where='{}.to_id=?'.format(DgEvolution.TABLE)
-            ),
-            (monster_id,),
-            DgEvolution)
+        return self._prev_evolution_by_monster.get(monster_id)
 
     def get_next_evolutions_by_monster(self, monster_id):
-        return self._query_many(
-            self._select_builder(
-                tables={DgEvolution.TABLE: DgEvolution.FIELDS},
-                where='{}.from_id=?'.format(DgEvolution.TABLE)
-            ),
-            (monster_id,),
-            DgEvolution,
-            as_generator=True)
+        return iter(self._next_evolutions_by_monster.get(monster_id, []))
 
     def get_evolution_by_material(self, monster_id):
-        return self._query_many(
-            self._select_builder(
-                tables={DgEvolution.TABLE: DgEvolution.FIELDS},
-                where=' OR '.join(['{}.mat_{}_id=?'.format(DgEvolution.TABLE, i) for i in range(1, 6)])
-            ),
-            (monster_id,) * 5,
-            DgEvolution)
+        return list(self._evolutions_by_material.get(monster_id, []))
+
+    def evolution_tree_is_farmable(self, base_monster_id):
+        return bool(self.get_acquisition(base_monster_id) & Acquisition.FARMABLE_EVO)
+
+    def evolution_tree_in_rem(self, base_monster_id):
+        return bool(self.get_acquisition(base_monster_id) & Acquisition.REM_EVO)
+
+    def evolution_tree_in_pem(self, base_monster_id):
+        return bool(self.get_acquisition(base_monster_id) & Acquisition.PEM_EVO)
+
+    def evolution_tree_in_mp_shop(self, base_monster_id):
+        return bool(self.get_acquisition(base_monster_id) & Acquisition.MP_SHOP_EVO)
 
     def get_base_monster_ids(self):
-        SELECT_BASE_MONSTER_ID = '''
-            SELECT evolutions.from_id as monster_id FROM evolutions WHERE evolutions.from_id NOT IN (SELECT DISTINCT evolutions.to_id FROM evolutions)
-            UNION
-            SELECT monsters.monster_id FROM monsters WHERE monsters.monster_id NOT IN (SELECT evolutions.from_id FROM evolutions UNION SELECT evolutions.to_id FROM evolutions)'''
-        return self._query_many(
-            SELECT_BASE_MONSTER_ID,
-            (),
-            DictWithAttrAccess,
-            as_generator=True)
+        return (DictWithAttrAccess({'monster_id': base_id}) for base_id in self._evolution_tree_ids)
+
+    def get_base_monster_id(self, monster_id):
+        return self._base_monster_id_by_monster.get(monster_id, monster_id)
+
+    def get_evolution_depth(self, monster_id):
+        return self._evolution_depth_by_monster.get(monster_id, 0)
 
     def get_evolution_tree_ids(self, base_monster_id):
+        evolution_tree = self._evolution_tree_ids.get(base_monster_id)
+        if evolution_tree is not None:
+            return list(evolution_tree)
+
+        # Not the root of a tree, walk the evolutions below it.
         # is not a tree i lied
         base_id = base_monster_id
         evolution_tree = [base_id]
@@ -572,22 +1191,30 @@ class DadguideDatabase(object):
             return res[k]
 
     def get_series(self, series_id: int):
-        return self._select_one_entry_by_pk(series_id, DgSeries)
+        return self._series.get(series_id)
 
     def _get_monsters_where(self, where, param):
-        return self._query_many(
+        # Only select the ids so the monsters come from the identity map
+        monster_ids = self._query_many(
             self._select_builder(
-                tables={DgMonster.TABLE: DgMonster.FIELDS},
+                tables={DgMonster.TABLE: (DgMonster.PK,)},
                 where=where
             ),
             param,
-            DgMonster)
+            DadguideItem)
+        return [self.get_monster(m.monster_id) for m in monster_ids]
 
     def get_monsters_by_series(self, series_id: int):
-        return self._get_monsters_where('{}.series_id=?'.format(DgMonster.TABLE), (series_id,))
+        return [self.get_monster(m_id) for m_id in self._monster_ids_by_series.get(series_id, [])]
 
     def get_monsters_by_active(self, active_skill_id: int):
-        return self._get_monsters_where('{}.active_skill_id=?'.format(DgMonster.TABLE), (active_skill_id,))
+        monster_ids = self._monster_ids_by_active.get(active_skill_id, [])
+        return [self.get_monster(m_id) for m_id in monster_ids]
+
+    def get_skillups(self, active_skill_id: int):
+        """Get the farmable monsters with an active skill, without building the ones that aren't."""
+        monster_ids = self._monster_ids_by_active.get(active_skill_id, [])
+        return [self.get_monster(m_id) for m_id in monster_ids if self.monster_is_farmable(m_id)]
 
     def get_monster_evo_gem(self, name: str, region='jp'):
         gem_suffix = {
@@ -614,15 +1241,29 @@ class DadguideDatabase(object):
             ())
 
     def get_monster(self, monster_id: int):
-        return self._select_one_entry_by_pk(monster_id, DgMonster)
+        monster = self.monster_cache.get(monster_id)
+        if monster is not None:
+            return monster
+        values = self._monster_values.get(monster_id)
+        if values is None:
+            return None
+        monster = self._monster_class(values, self)
+        self.monster_cache.put(monster_id, monster)
+        return monster
 
     def get_all_monster_jp_name(self, as_generator=True):
         return self._query_many(self._select_builder(tables={DgMonster.TABLE: ('name_jp',)}), (), DictWithAttrAccess,
                                 as_generator=as_generator)
 
     def get_all_monsters(self, as_generator=True):
-        return self._query_many(self._select_builder(tables={DgMonster.TABLE: DgMonster.FIELDS}), (), DgMonster,
-                                as_generator=as_generator)
+        monsters = (self._monster_class(values, self) for values in self._monster_values.values())
+        return monsters if as_generator else list(monsters)
+
+    def get_monsters(self, monster_ids, as_generator=True):
+        # Like get_all_monsters, a bulk read shouldn't flush monster_cache
+        monsters = (self._monster_class(self._monster_values[monster_id], self)
+                    for monster_id in monster_ids)
+        return monsters if as_generator else list(monsters)
 
 
 def enum_or_none(enum, value, default=None):
@@ -638,27 +1279,123 @@ class DictWithAttrAccess(dict):
         self.__dict__ = self
 
 
-class DadguideItem(DictWithAttrAccess):
+class DadguideItem(object):
     """
     Base class for all items loaded from DadGuide.
-    Is a dict with attr access.
+    Has attr access, and dict-style access by column name and by the fields
+    subclasses compute from them.
+
+    Rows are loaded into a subclass generated by make_record_class that keeps each
+    column in a slot.
     """
+    __slots__ = ('_database',)
     TABLE = None
     FIELDS = '*'
     PK = None
     AS_BOOL = ()
 
+    # Set on generated record classes: the slot each column is stored in, in row order
+    COLUMN_SLOTS = ()
+    # Key -> slot for the columns, then the fields the subclass computes
+    FIELD_SLOTS = {}
+
     def __init__(self, item, database):
-        super(DadguideItem, self).__init__(item)
         self._database = database
+        for slot, value in zip(self.COLUMN_SLOTS, item):
+            setattr(self, slot, value)
         for k in self.AS_BOOL:
             self[k] = bool(self[k])
 
     def key(self):
         return self[self.PK]
 
+    def __getitem__(self, k):
+        try:
+            return getattr(self, self.FIELD_SLOTS[k])
+        except (KeyError, AttributeError):
+            raise KeyError(k)
+
+    def __setitem__(self, k, v):
+        if k not in self.FIELD_SLOTS:
+            raise KeyError(k)
+        setattr(self, self.FIELD_SLOTS[k], v)
+
+    def __contains__(self, k):
+        return k in self.FIELD_SLOTS and hasattr(self, self.FIELD_SLOTS[k])
+
+    def __iter__(self):
+        return iter(self.keys())
+
+    def __len__(self):
+        return len(self.keys())
+
+    def __eq__(self, other):
+        if not isinstance(other, DadguideItem):
+            return NotImplemented
+        return self.items() == other.items()
+
+    # Items compare by value like the dicts they replaced, so they aren't hashable either
+    __hash__ = None
+
+    def get(self, k, default=None):
+        return self[k] if k in self else default
+
+    def keys(self):
+        # Computed fields only once they've been set
+        return [k for k, slot in self.FIELD_SLOTS.items() if hasattr(self, slot)]
+
+    def values(self):
+        return [self[k] for k in self.keys()]
+
+    def items(self):
+        return [(k, self[k]) for k in self.keys()]
+
+    def __repr__(self):
+        return '{}({})'.format(type(self).__name__, dict(self.items()))
+
+
+def make_record_class(d_type, fields):
+    """Generate a subclass of d_type storing the given columns in __slots__.
+
+    Columns named like an attribute of d_type (a property, say) or that aren't valid
+    identifiers are stored under a generated slot name, so they stay reachable by key
+    without hiding the attribute.
+    """
+    base_slots = []
+    for cls in reversed(d_type.__mro__):
+        base_slots.extend(s for s in getattr(cls, '__slots__', ()) if s not in base_slots)
+
+    slots = []
+    field_slots = OrderedDict()
+    for i, f in enumerate(fields):
+        if f in base_slots and f != '_database':
+            # Computed by the item class from the column, like the old dict based items did
+            slot = f
+        elif f.isidentifier() and not f.startswith('_') and not hasattr(d_type, f):
+            slot = f
+            slots.append(slot)
+        else:
+            slot = '_column_{}'.format(i)
+            slots.append(slot)
+        field_slots[f] = slot
+    column_slots = tuple(field_slots.values())
+
+    # Like the attributes the old dict based items set, these are items too
+    for slot in base_slots:
+        if slot != '_database' and slot not in field_slots:
+            field_slots[slot] = slot
+
+    return type(d_type.__name__, (d_type,), {
+        '__slots__': tuple(slots),
+        '__module__': d_type.__module__,
+        '__qualname__': d_type.__qualname__,
+        'COLUMN_SLOTS': column_slots,
+        'FIELD_SLOTS': field_slots,
+    })
+
 
 class DgActiveSkill(DadguideItem):
+    __slots__ = ()
     TABLE = 'active_skills'
     PK = 'active_skill_id'
 
@@ -668,7 +1405,11 @@ class DgActiveSkill(DadguideItem):
 
     @property
     def skillups(self):
-        return list(filter(lambda x: x.farmable, self.monsters))
+        return self._database.get_skillups(self.active_skill_id)
+
+    @property
+    def search_features(self):
+        return self._database.get_active_skill_features(self.active_skill_id)
 
     @property
     def desc(self):
@@ -680,6 +1421,7 @@ class DgActiveSkill(DadguideItem):
 
 
 class DgLeaderSkill(DadguideItem):
+    __slots__ = ()
     TABLE = 'leader_skills'
     PK = 'leader_skill_id'
 
@@ -687,6 +1429,10 @@ class DgLeaderSkill(DadguideItem):
     def data(self):
         return self.max_hp, self.max_atk, self.max_rcv, self.max_shield
 
+    @property
+    def search_text(self):
+        return self._database.get_leader_skill_search_text(self.leader_skill_id)
+
     @property
     def desc(self):
         return self.desc_na or self.desc_jp
@@ -697,6 +1443,7 @@ class DgLeaderSkill(DadguideItem):
 
 
 class DgAwakening(DadguideItem):
+    __slots__ = ()
     TABLE = 'awakenings'
     PK = 'awakening_id'
     AS_BOOL = ['is_super']
@@ -714,6 +1461,7 @@ class DgAwakening(DadguideItem):
 
 
 class DgAwokenSkill(DadguideItem):
+    __slots__ = ()
     TABLE = 'awoken_skills'
     PK = 'awoken_skill_id'
 
@@ -723,6 +1471,7 @@ class DgAwokenSkill(DadguideItem):
 
 
 class DgEvolution(DadguideItem):
+    __slots__ = ()
     TABLE = 'evolutions'
     PK = 'evolution_id'
 
@@ -732,6 +1481,7 @@ class DgEvolution(DadguideItem):
 
 
 class DgSeries(DadguideItem):
+    __slots__ = ()
     TABLE = 'series'
     PK = 'series_id'
 
@@ -745,21 +1495,25 @@ class DgSeries(DadguideItem):
 
 
 class DgDungeon(DadguideItem):
+    __slots__ = ()
     TABLE = 'dungeons'
     PK = 'dungeon_id'
 
 
 class DgEncounter(DadguideItem):
+    __slots__ = ()
     TABLE = 'encounters'
     PK = 'encounter_id'
 
 
 class DgDrop(DadguideItem):
+    __slots__ = ()
     TABLE = 'drops'
     PK = 'drop_id'
 
 
 class DgScheduledEvent(DadguideItem):
+    __slots__ = ()
     TABLE = 'schedule'
     PK = 'event_id'
 
@@ -773,6 +1527,9 @@ class DgScheduledEvent(DadguideItem):
 
 
 class DgMonster(DadguideItem):
+    __slots__ = ('roma_subname', 'attr1', 'attr2', 'type1', 'type2', 'type3', 'types', 'in_pem',
+                 'in_rem', 'awakenings', 'superawakening_count', 'is_inheritable', 'evo_from',
+                 'is_equip', '_base_monster_id', '_alt_evo_id_list', 'acquisition', 'search')
     TABLE = 'monsters'
     PK = 'monster_id'
     AS_BOOL = ('on_jp', 'on_na', 'on_kr', 'has_animation', 'has_hqimage')
@@ -809,14 +1566,11 @@ class DgMonster(DadguideItem):
 
         self.is_equip = any([x.awoken_skill_id == 49 for x in self.awakenings])
 
-        base_id = self.monster_id
-        next_base = self._database.get_prev_evolution_by_monster(base_id)
-        while next_base is not None:
-            base_id = next_base.from_id
-            next_base = self._database.get_prev_evolution_by_monster(base_id)
-        self._base_monster_id = base_id
+        self._base_monster_id = self._database.get_base_monster_id(self.monster_id)
         self._alt_evo_id_list = self._database.get_evolution_tree_ids(self._base_monster_id)
 
+        self.acquisition = self._database.get_acquisition(self.monster_id)
+
         self.search = MonsterSearchHelper(self)
 
     @property
@@ -842,17 +1596,8 @@ class DgMonster(DadguideItem):
         return int(round(s_val))
 
     def stats(self, lv=99, plus=0, inherit=False):
-        is_plus_297 = False
-        if plus == 297:
-            plus = (99, 99, 99)
-            is_plus_297 = True
-        elif plus == 0:
-            plus = (0, 0, 0)
-        hp = self.stat('hp', lv, plus[0], inherit, is_plus_297)
-        atk = self.stat('atk', lv, plus[1], inherit, is_plus_297)
-        rcv = self.stat('rcv', lv, plus[2], inherit, is_plus_297)
-        weighted = int(round(hp / 10 + atk / 5 + rcv / 3))
-        return hp, atk, rcv, weighted
+        # Computed for the whole catalog at once and cached; see StatTable
+        return self._database.stat_table.monster_stats(self.monster_id, lv, plus, inherit)
 
     @property
     def active_skill(self):
@@ -915,28 +1660,19 @@ class DgMonster(DadguideItem):
 
     @property
     def farmable(self):
-        return self._database.monster_is_farmable(self.monster_id)
+        return bool(self.acquisition & Acquisition.FARMABLE)
 
     @property
     def farmable_evo(self):
-        for e_id in self._alt_evo_id_list:
-            if self._database.monster_is_farmable(e_id):
-                return True
-        return False
+        return bool(self.acquisition & Acquisition.FARMABLE_EVO)
 
     @property
     def rem_evo(self):
-        for e_id in self._alt_evo_id_list:
-            if self._database.monster_in_rem(e_id):
-                return True
-        return False
+        return bool(self.acquisition & Acquisition.REM_EVO)
 
     @property
     def pem_evo(self):
-        for e_id in self._alt_evo_id_list:
-            if self._database.monster_in_pem(e_id):
-                return True
-        return False
+        return bool(self.acquisition & Acquisition.PEM_EVO)
 
     @property
     def killers(self):
@@ -962,10 +1698,7 @@ class DgMonster(DadguideItem):
 
     @property
     def mp_evo(self):
-        for e_id in self._alt_evo_id_list:
-            if self._database.monster_in_mp_shop(e_id):
-                return True
-        return False
+        return bool(self.acquisition & Acquisition.MP_SHOP_EVO)
 
     @property
     def history_us(self):
@@ -985,11 +1718,8 @@ class MonsterSearchHelper(object):
 
         self.name = '{} {}'.format(m.name_na, m.name_jp).lower()
         leader_skill = m.leader_skill
-        self.leader = leader_skill.desc.lower() if leader_skill else ''
+        self.leader = leader_skill.search_text if leader_skill else ''
         active_skill = m.active_skill
-        self.active_name = active_skill.name.lower() if active_skill else ''
-        self.active_desc = active_skill.desc.lower() if active_skill else ''
-        self.active = '{} {}'.format(self.active_name, self.active_desc)
         self.active_min = active_skill.turn_min if active_skill else None
         self.active_max = active_skill.turn_max if active_skill else None
 
@@ -1000,10 +1730,37 @@ class MonsterSearchHelper(object):
 
         self.types = [t.name for t in m.types]
 
-        def replace_colors(text: str):
-            return text.replace('red', 'fire').replace('blue', 'water').replace('green', 'wood')
+        # Shared by every monster with the skill, don't modify
+        features = active_skill.search_features if active_skill else NO_ACTIVE_SKILL_FEATURES
+        self.active_name = features.active_name
+        self.active_desc = features.active_desc
+        self.active = features.active
+        self.board_change = features.board_change
+        self.orb_convert = features.orb_convert
+        self.row_convert = features.row_convert
+        self.column_convert = features.column_convert
+
+
+def replace_colors(text: str):
+    return text.replace('red', 'fire').replace('blue', 'water').replace('green', 'wood')
+
+
+def leader_skill_search_text(leader_skill):
+    return replace_colors(leader_skill.desc.lower())
+
+
+class ActiveSkillSearchFeatures(object):
+    """The parts of an active skill that MonsterSearchHelper searches on.
+
+    Parsing the description is the slow part of building a MonsterSearchHelper, and lots of
+    monsters share a skill, so the database parses each skill once when it loads.
+    """
+
+    def __init__(self, active_skill=None):
+        self.active_name = active_skill.name.lower() if active_skill else ''
+        self.active_desc = active_skill.desc.lower() if active_skill else ''
+        self.active = '{} {}'.format(self.active_name, self.active_desc)
 
-        self.leader = replace_colors(self.leader)
         self.active = replace_colors(self.active)
         self.active_name = replace_colors(self.active_name)
         self.active_desc = replace_colors(self.active_desc)
@@ -1083,6 +1840,12 @@ class MonsterSearchHelper(object):
                         for do in dest_orbs:
                             self.orb_convert[so].append(do)
 
+        # Shared between monsters, so don't let lookups of missing colors add to it
+        self.orb_convert = dict(self.orb_convert)
+
+
+NO_ACTIVE_SKILL_FEATURES = ActiveSkillSearchFeatures()
+
 
 def make_roma_subname(name_jp):
     subname = name_jp.replace('＝', '')
@@ -1134,24 +1897,28 @@ class MonsterIndex(object):
             175: ['valentines', 'vday'],
         }
 
+        # Kept so with_overrides can tell which groups a new set of overrides touches
+        self.nickname_overrides = nickname_overrides
+        self.basename_overrides = basename_overrides
+        # Hash of the database file this was built from, if known; see Dadguide._build_snapshot
+        self.database_hash = None
+
+        self.nickname_fuzzy_cutoff = DEFAULT_NICKNAME_FUZZY_CUTOFF
+        self.name_fuzzy_cutoff = DEFAULT_NAME_FUZZY_CUTOFF
+
+        # Distinct prefix and nickname sets, shared between the NamedMonsters that have them
+        self.shared_prefix_sets = {}
+        self.shared_nickname_sets = {}
+
         monster_id_to_nicknames = defaultdict(set)
         for nickname, monster_id in nickname_overrides.items():
             monster_id_to_nicknames[monster_id].add(nickname)
 
         named_monsters = []
         for base_mon in base_monster_ids:
-            base_id = base_mon.monster_id
-            group_basename_overrides = basename_overrides.get(base_id, [])
-            evolution_tree = [monster_database.get_monster(m) for m in
-                              monster_database.get_evolution_tree_ids(base_id)]
-            named_mg = NamedMonsterGroup(evolution_tree, group_basename_overrides)
-            for monster in evolution_tree:
-                if accept_filter and not accept_filter(monster):
-                    continue
-                prefixes = self.compute_prefixes(monster, evolution_tree)
-                extra_nicknames = monster_id_to_nicknames[monster.monster_id]
-                named_monster = NamedMonster(monster, named_mg, prefixes, extra_nicknames)
-                named_monsters.append(named_monster)
+            named_monsters.extend(self._build_group(monster_database, base_mon.monster_id,
+                                                    basename_overrides, monster_id_to_nicknames,
+                                                    accept_filter))
 
         # Sort the NamedMonsters into the opposite order we want to accept their nicknames in
         # This order is:
@@ -1165,8 +1932,107 @@ class MonsterIndex(object):
 
         named_monsters.sort(key=named_monsters_sort)
 
+        # Each of these maps keeps the best NamedMonster for a key. When several monsters want
+        # the same key, the ones that lost are kept in the matching *_candidates map (best
+        # first, winner included) so a MonsterIndexView can fall back to one it accepts.
+        self.all_entries = {}
+        self.entry_candidates = {}
+        self.two_word_entries = {}
+        self.two_word_entry_candidates = {}
+        self.all_na_name_to_monsters = {}
+        self.na_name_candidates = {}
+        self.monster_no_na_to_named_monster = {}
+        self.monster_no_na_candidates = {}
+        for nm in named_monsters:
+            for nickname in nm.final_nicknames:
+                add_ranked_entry(self.all_entries, self.entry_candidates, nickname, nm)
+            for nickname in nm.final_two_word_nicknames:
+                add_ranked_entry(self.two_word_entries, self.two_word_entry_candidates,
+                                 nickname, nm)
+            add_ranked_entry(self.all_na_name_to_monsters, self.na_name_candidates,
+                             nm.name_na.lower(), nm)
+            add_ranked_entry(self.monster_no_na_to_named_monster, self.monster_no_na_candidates,
+                             nm.monster_no_na, nm)
+
+        self.all_monsters = named_monsters
+        self.monster_no_to_named_monster = {m.monster_id: m for m in named_monsters}
+
+        for nickname, monster_id in nickname_overrides.items():
+            nm = self.monster_no_to_named_monster.get(monster_id)
+            if nm:
+                add_ranked_entry(self.all_entries, self.entry_candidates, nickname, nm)
+
+        self._index_prefixes()
+        self._index_pantheons(panthname_overrides)
+        self._index_entry_keys()
+        self._index_names()
+        self._index_readings()
+
+    def _build_group(self, monster_database, base_id, basename_overrides, monster_id_to_nicknames,
+                     accept_filter=None):
+        """Build the NamedMonsters for the evolution tree rooted at base_id."""
+        group_basename_overrides = basename_overrides.get(base_id, [])
+        evolution_tree = [monster_database.get_monster(m) for m in
+                          monster_database.get_evolution_tree_ids(base_id)]
+        named_mg = NamedMonsterGroup(evolution_tree, group_basename_overrides)
+        named_monsters = []
+        for monster in evolution_tree:
+            if accept_filter and not accept_filter(monster):
+                continue
+            prefixes = self.compute_prefixes(monster, evolution_tree)
+            extra_nicknames = frozenset(
+                monster_id_to_nicknames.get(monster.monster_id, NO_NICKNAMES))
+            named_monster = NamedMonster(monster, named_mg, prefixes, extra_nicknames)
+            # Most monsters have the same prefixes as many others, keep one copy of each set
+            prefixes = frozenset(named_monster.prefixes)
+            named_monster.prefixes = self.shared_prefix_sets.setdefault(prefixes, prefixes)
+            nicknames = named_monster.final_nicknames
+            two_word_nicknames = named_monster.final_two_word_nicknames
+            named_monster.final_nicknames = self.shared_nickname_sets.setdefault(
+                nicknames, nicknames)
+            named_monster.final_two_word_nicknames = self.shared_nickname_sets.setdefault(
+                two_word_nicknames, two_word_nicknames)
+            named_monsters.append(named_monster)
+        return named_monsters
+
+    def _index_prefixes(self, prefix_bits=None):
+        """Give each prefix a bit, and each NamedMonster the mask of its prefixes.
+
+        Checking that a monster has all of a query's prefixes is then a single AND. Bits from
+        prefix_bits are kept and new prefixes get the next free ones, so NamedMonsters shared
+        with another index keep masks that are valid in both.
+        """
+        self.all_prefixes = set()
+        for nm in self.all_monsters:
+            self.all_prefixes.update(nm.prefixes)
+        self.prefix_bits = dict(prefix_bits or {})
+        for prefix in sorted(self.all_prefixes.difference(self.prefix_bits)):
+            self.prefix_bits[prefix] = 1 << len(self.prefix_bits)
+
+        prefix_to_monster_ids = defaultdict(set)
+        for nm in self.all_monsters:
+            mask = 0
+            for prefix in nm.prefixes:
+                mask |= self.prefix_bits[prefix]
+                prefix_to_monster_ids[prefix].add(nm.monster_id)
+            nm.prefix_mask = mask
+        self.prefix_to_monster_ids = {prefix: frozenset(ids)
+                                      for prefix, ids in prefix_to_monster_ids.items()}
+
+    def prefixes_mask(self, prefixes):
+        mask = 0
+        for prefix in prefixes:
+            mask |= self.prefix_bits[prefix]
+        return mask
+
+    def monster_ids_with_prefixes(self, prefixes):
+        """Get the ids of the monsters that have every one of prefixes."""
+        postings = sorted((self.prefix_to_monster_ids[prefix] for prefix in prefixes), key=len)
+        return postings[0].intersection(*postings[1:])
+
+    def _index_pantheons(self, panthname_overrides):
         # set up a set of all pantheon names, a set of all pantheon nicknames, and a dictionary of nickname -> full name
-        # later we will set up a dictionary of pantheon full name -> monsters
+        # then a dictionary of pantheon full name -> monsters
         self.all_pantheon_names = set()
         self.all_pantheon_names.update(panthname_overrides.values())
 
@@ -1176,30 +2042,255 @@ class MonsterIndex(object):
         self.all_pantheon_nicknames = set()
         self.all_pantheon_nicknames.update(panthname_overrides.keys())
 
-        self.all_prefixes = set()
+        # Pantheon names are matched against series names ignoring case
+        self.series_to_pantheon = {pantheon.lower(): pantheon.lower()
+                                   for pantheon in self.all_pantheon_names}
+
         self.pantheons = defaultdict(set)
-        self.all_entries = {}
-        self.two_word_entries = {}
-        for nm in named_monsters:
-            self.all_prefixes.update(nm.prefixes)
-            for nickname in nm.final_nicknames:
-                self.all_entries[nickname] = nm
-            for nickname in nm.final_two_word_nicknames:
-                self.two_word_entries[nickname] = nm
+        for nm in self.all_monsters:
             if nm.series:
-                for pantheon in self.all_pantheon_names:
-                    if pantheon.lower() == nm.series.lower():
-                        self.pantheons[pantheon.lower()].add(nm)
-
-        self.all_monsters = named_monsters
-        self.all_na_name_to_monsters = {m.name_na.lower(): m for m in named_monsters}
-        self.monster_no_na_to_named_monster = {m.monster_no_na: m for m in named_monsters}
-        self.monster_no_to_named_monster = {m.monster_id: m for m in named_monsters}
+                pantheon = self.series_to_pantheon.get(nm.series.lower())
+                if pantheon is not None:
+                    self.pantheons[pantheon].add(nm)
+
+        # Pantheon nicknames by their lowercased form, plus trigrams of that for substring searches
+        self.lower_pantheon_nicknames = defaultdict(list)
+        pantheon_nickname_trigrams = defaultdict(set)
+        for nickname in self.all_pantheon_nicknames:
+            lower_nickname = nickname.lower()
+            self.lower_pantheon_nicknames[lower_nickname].append(nickname)
+            for gram in ngrams(lower_nickname, 3):
+                pantheon_nickname_trigrams[gram].add(lower_nickname)
+        self.lower_pantheon_nicknames = dict(self.lower_pantheon_nicknames)
+        self.pantheon_nickname_trigrams = {
+            gram: frozenset(nicknames) for gram, nicknames in pantheon_nickname_trigrams.items()}
+
+    def pantheon_nicknames_equal_to(self, query):
+        """Get the pantheon nicknames that lowercase to query."""
+        return self.lower_pantheon_nicknames.get(query, [])
+
+    def pantheon_nicknames_containing(self, query):
+        """Get the pantheon nicknames whose lowercased form contains query."""
+        if len(query) >= 3:
+            postings = sorted((self.pantheon_nickname_trigrams.get(gram, frozenset())
+                               for gram in set(ngrams(query, 3))), key=len)
+            lower_nicknames = set(postings[0]).intersection(*postings[1:])
+        else:
+            lower_nicknames = self.lower_pantheon_nicknames.keys()
+        return [nickname for lower_nickname in lower_nicknames if query in lower_nickname
+                for nickname in self.lower_pantheon_nicknames[lower_nickname]]
+
+    def _index_entry_keys(self):
+        """Sort nicknames and names so prefix searches are a bisect instead of a scan."""
+        self.sorted_entry_keys = sorted(self.all_entries)
+        self.sorted_entry_values = [self.all_entries[k] for k in self.sorted_entry_keys]
+
+        self.entry_keys_by_id = defaultdict(list)
+        for nickname, nm in self.all_entries.items():
+            self.entry_keys_by_id[nm.monster_id].append(nickname)
+        self.entry_keys_by_id = dict(self.entry_keys_by_id)
+
+        # NamedMonsters that own at least one nickname or NA name; some name searches are
+        # limited to them
+        self.entry_holder_ids = frozenset(nm.monster_id for nm in self.all_entries.values())
+        self.na_name_holder_ids = frozenset(nm.monster_id
+                                            for nm in self.all_na_name_to_monsters.values())
+
+        # Include every monster that could own a nickname in some view, views check their own
+        # holders
+        possible_holders = set(self.all_entries.values())
+        for candidates in self.entry_candidates.values():
+            possible_holders.update(candidates)
+        names = []
+        for nm in possible_holders:
+            names.append((nm.name_na.lower(), nm))
+            names.append((nm.name_jp.lower(), nm))
+        names.sort(key=lambda x: (x[0], x[1].monster_id))
+        self.sorted_names = [name for name, _ in names]
+        self.sorted_name_monsters = [nm for _, nm in names]
+
+        self.nickname_matcher = FuzzyMatcher(self.sorted_entry_keys)
+        self.na_name_matcher = FuzzyMatcher(self.all_na_name_to_monsters.keys())
+
+    def _index_names(self):
+        """Build n-gram posting lists over the lowercased NA/JP names for substring searches.
+
+        Every name gets trigrams. Names with Japanese in them get bigrams too, since JP
+        queries can be two characters long. Postings hold monster ids rather than
+        NamedMonsters, so with_overrides can share them.
+        """
+        self.lower_names = {}
+        trigrams = defaultdict(set)
+        bigrams = defaultdict(set)
+        for nm in self.all_monsters:
+            names = (nm.name_na.lower(), nm.name_jp.lower())
+            self.lower_names[nm.monster_id] = names
+            for name in names:
+                for gram in ngrams(name, 3):
+                    trigrams[gram].add(nm.monster_id)
+                if rpadutils.containsJp(name):
+                    for gram in ngrams(name, 2):
+                        bigrams[gram].add(nm.monster_id)
+        self.name_trigrams = {gram: frozenset(ids) for gram, ids in trigrams.items()}
+        self.name_bigrams = {gram: frozenset(ids) for gram, ids in bigrams.items()}
+
+    def _index_readings(self):
+        """Index the readings of the JP names, so kana and romaji spellings of a name find it.
+
+        Readings are kept sorted for prefix searches, plus in a dict for exact matches. Like
+        the name n-grams they hold monster ids, and don't depend on the override sheets.
+        """
+        reading_to_monster_ids = defaultdict(set)
+        for nm in self.all_monsters:
+            for reading in name_readings(nm.name_jp):
+                reading_to_monster_ids[reading].add(nm.monster_id)
+        self.reading_to_monster_ids = {reading: frozenset(ids)
+                                       for reading, ids in reading_to_monster_ids.items()}
+
+        readings = sorted((reading, m_id)
+                          for reading, ids in reading_to_monster_ids.items() for m_id in ids)
+        self.sorted_readings = [reading for reading, _ in readings]
+        self.sorted_reading_ids = array.array('i', (m_id for _, m_id in readings))
+
+    def monster_ids_with_reading(self, query):
+        """Get the ids of monsters whose JP name reading equals query, or else starts with it."""
+        reading = query_reading(query)
+        if not reading:
+            return set()
+        ids = self.reading_to_monster_ids.get(reading)
+        if ids:
+            return set(ids)
+        lo, hi = prefix_range(self.sorted_readings, reading)
+        return set(self.sorted_reading_ids[lo:hi])
+
+    def monster_ids_with_name_containing(self, query):
+        """Get the ids of monsters whose lowercased NA or JP name contains query."""
+        if len(query) >= 3:
+            postings = [self.name_trigrams.get(gram, frozenset()) for gram in set(ngrams(query, 3))]
+        elif len(query) == 2 and rpadutils.containsJp(query):
+            postings = [self.name_bigrams.get(query, frozenset())]
+        else:
+            # Too short for the n-grams to narrow anything down
+            postings = [self.lower_names.keys()]
+
+        postings.sort(key=len)
+        candidates = set(postings[0]).intersection(*postings[1:])
+        return {m_id for m_id in candidates
+                if query in self.lower_names[m_id][0] or query in self.lower_names[m_id][1]}
+
+    def nicknames_with_prefix(self, prefix, view=None):
+        """Yield the NamedMonster for each nickname starting with prefix."""
+        accepted = view.accepted_ids if view else None
+        lo, hi = prefix_range(self.sorted_entry_keys, prefix)
+        for i in range(lo, hi):
+            nm = self.sorted_entry_values[i]
+            if accepted is not None and nm.monster_id not in accepted:
+                nm = self.get_entry(self.all_entries, self.entry_candidates,
+                                    self.sorted_entry_keys[i], accepted)
+                if nm is None:
+                    continue
+            yield nm
+
+    def names_with_prefix(self, prefix, view=None):
+        """Yield NamedMonsters owning a nickname whose NA or JP name starts with prefix."""
+        holder_ids = view.entry_holder_ids if view else self.entry_holder_ids
+        lo, hi = prefix_range(self.sorted_names, prefix)
+        for i in range(lo, hi):
+            nm = self.sorted_name_monsters[i]
+            if nm.monster_id in holder_ids:
+                yield nm
+
+    def with_overrides(self, monster_database, nickname_overrides, basename_overrides,
+                       panthname_overrides):
+        """Get an index for new override sheets, rebuilding only the groups they touch.
+
+        monster_database must have the same contents as the one this index was built from,
+        and this index must not have been built with an accept_filter. This index is not
+        modified, so it can keep serving lookups meanwhile.
+        """
+        changed_nicknames = {k for k in set(self.nickname_overrides) | set(nickname_overrides)
+                             if self.nickname_overrides.get(k) != nickname_overrides.get(k)}
+        changed_monster_ids = set()
+        for k in changed_nicknames:
+            changed_monster_ids.add(self.nickname_overrides.get(k))
+            changed_monster_ids.add(nickname_overrides.get(k))
+        changed_base_ids = {monster_database.get_base_monster_id(m_id)
+                            for m_id in changed_monster_ids if m_id}
+        for base_id in set(self.basename_overrides) | set(basename_overrides):
+            old_basenames = set(self.basename_overrides.get(base_id, ()))
+            if old_basenames != set(basename_overrides.get(base_id, ())):
+                changed_base_ids.add(base_id)
+
+        old_nms = [nm for nm in self.all_monsters if nm.base_monster_no in changed_base_ids]
+        rebuilt_base_ids = sorted({nm.base_monster_no for nm in old_nms})
 
+        monster_id_to_nicknames = defaultdict(set)
         for nickname, monster_id in nickname_overrides.items():
-            nm = self.monster_no_to_named_monster.get(monster_id)
-            if nm:
-                self.all_entries[nickname] = nm
+            monster_id_to_nicknames[monster_id].add(nickname)
+        new_nms = []
+        for base_id in rebuilt_base_ids:
+            new_nms.extend(self._build_group(monster_database, base_id, basename_overrides,
+                                             monster_id_to_nicknames))
+        print('patching monster index for {} changed groups'.format(len(rebuilt_base_ids)))
+
+        index = copy.copy(self)
+        index.nickname_overrides = nickname_overrides
+        index.basename_overrides = basename_overrides
+
+        # Nothing the overrides affect changes the sort order, so new monsters take the old
+        # ones' places
+        new_nm_by_id = {nm.monster_id: nm for nm in new_nms}
+        index.all_monsters = [new_nm_by_id.get(nm.monster_id, nm) for nm in self.all_monsters]
+        index.monster_no_to_named_monster = {nm.monster_id: nm for nm in index.all_monsters}
+        rank = {nm.monster_id: i for i, nm in enumerate(index.all_monsters)}
+
+        def nickname_override(nickname):
+            monster_id = nickname_overrides.get(nickname)
+            return index.monster_no_to_named_monster.get(monster_id) if monster_id else None
+
+        index.all_entries, index.entry_candidates = patch_ranked_entries(
+            self.all_entries, self.entry_candidates, old_nms, new_nms, rank,
+            lambda nm: nm.final_nicknames, extra_keys=changed_nicknames, top_of=nickname_override)
+        index.two_word_entries, index.two_word_entry_candidates = patch_ranked_entries(
+            self.two_word_entries, self.two_word_entry_candidates, old_nms, new_nms, rank,
+            lambda nm: nm.final_two_word_nicknames)
+        index.all_na_name_to_monsters, index.na_name_candidates = patch_ranked_entries(
+            self.all_na_name_to_monsters, self.na_name_candidates, old_nms, new_nms, rank,
+            lambda nm: (nm.name_na.lower(),))
+        index.monster_no_na_to_named_monster, index.monster_no_na_candidates = patch_ranked_entries(
+            self.monster_no_na_to_named_monster, self.monster_no_na_candidates, old_nms, new_nms,
+            rank, lambda nm: (nm.monster_no_na,))
+
+        index._index_prefixes(self.prefix_bits)
+        index._index_pantheons(panthname_overrides)
+        index._index_entry_keys()
+        return index
+
+    def view(self, named_monster_filter):
+        """Get this index restricted to the NamedMonsters accepted by named_monster_filter."""
+        return MonsterIndexView(self, named_monster_filter)
+
+    def iter_entries(self, entries: dict, candidates: dict, accepted=None):
+        """Iterate over (key, NamedMonster) in one of the ranked maps, as seen by a view."""
+        if accepted is None:
+            yield from entries.items()
+            return
+        for key, nm in entries.items():
+            if nm.monster_id not in accepted:
+                nm = self.get_entry(entries, candidates, key, accepted)
+                if nm is None:
+                    continue
+            yield key, nm
+
+    def get_entry(self, entries: dict, candidates: dict, key, accepted=None):
+        """Look up key in one of the ranked maps, as seen by a view."""
+        nm = entries.get(key)
+        if nm is None or accepted is None or nm.monster_id in accepted:
+            return nm
+        for candidate in candidates.get(key, ()):
+            if candidate.monster_id in accepted:
+                return candidate
+        return None
 
     def init_index(self):
         pass
@@ -1283,11 +2374,51 @@ class MonsterIndex(object):
         return prefixes
 
     def find_monster(self, query):
-        query = rpadutils.rmdiacritics(query).lower().strip()
+        return self._find_monster(query)
+
+    def find_monsters(self, queries):
+        """Look up several queries at once, returning {query: find_monster(query)}.
+
+        Queries that normalize to the same thing are only searched once, and each match tier
+        runs over all the queries still unresolved before moving on to the next one.
+        """
+        return self._find_monsters(queries)
+
+    def _find_monster(self, query, view=None):
+        return self._find_monsters([query], view)[query]
+
+    def _find_monsters(self, queries, view=None):
+        normalized = {query: rpadutils.rmdiacritics(query).lower().strip() for query in queries}
+        pending = set(normalized.values())
+        results = {}
+        for tier in self._find_monster_tiers(view):
+            for query in pending:
+                result = tier(query)
+                if result is not None:
+                    results[query] = result
+            pending.difference_update(results)
+            if not pending:
+                break
+
+        # couldn't find anything
+        for query in pending:
+            results[query] = None, "Could not find a match for: " + query, None
+        return {query: results[normalized_query] for query, normalized_query in normalized.items()}
+
+    def _find_monster_tiers(self, view=None):
+        """Get the tiers of find_monster in order, as functions of a normalized query.
+
+        A tier returns the (NamedMonster, err, debug_info) result if it settles the query,
+        or None to leave it to the next tier.
+        """
+        accepted = view.accepted_ids if view else None
 
         # id search
-        if query.isdigit():
-            m = self.monster_no_na_to_named_monster.get(int(query))
+        def id_lookup(query):
+            if not query.isdigit():
+                return None
+            m = self.get_entry(self.monster_no_na_to_named_monster, self.monster_no_na_candidates,
+                               int(query), accepted)
             if m is None:
                 return None, 'Looks like a monster ID but was not found', None
             else:
@@ -1297,78 +2428,201 @@ class MonsterIndex(object):
         # TODO: need to handle na_only?
 
         # handle exact nickname match
-        if query in self.all_entries:
-            return self.all_entries[query], None, "Exact nickname"
+        def exact_nickname(query):
+            m = self.get_entry(self.all_entries, self.entry_candidates, query, accepted)
+            if m is not None:
+                return m, None, "Exact nickname"
 
-        contains_jp = rpadutils.containsJp(query)
-        if len(query) < 2 and contains_jp:
-            return None, 'Japanese queries must be at least 2 characters', None
-        elif len(query) < 4 and not contains_jp:
-            return None, 'Your query must be at least 4 letters', None
+        def too_short(query):
+            contains_jp = rpadutils.containsJp(query)
+            if len(query) < 2 and contains_jp:
+                return None, 'Japanese queries must be at least 2 characters', None
+            elif len(query) < 4 and not contains_jp:
+                return None, 'Your query must be at least 4 letters', None
+
+        # search_ranked walks the same tiers keeping only the best k, these keep every match for
+        # the debug info
 
-        # TODO: this should be a length-limited priority queue
-        matches = set()
         # prefix search for nicknames, space-preceeded, take max id
-        for nickname, m in self.all_entries.items():
-            if nickname.startswith(query + ' '):
-                matches.add(m)
-        if len(matches):
-            return self.pickBestMonster(matches), None, "Space nickname prefix, max of {}".format(len(matches))
+        def space_nickname_prefix(query):
+            matches = set(self.nicknames_with_prefix(query + ' ', view))
+            if len(matches):
+                return self.pickBestMonster(matches), None, \
+                    "Space nickname prefix, max of {}".format(len(matches))
 
         # prefix search for nicknames, take max id
-        for nickname, m in self.all_entries.items():
-            if nickname.startswith(query):
-                matches.add(m)
-        if len(matches):
-            all_names = ",".join(map(lambda x: x.name_na, matches))
-            return self.pickBestMonster(matches), None, "Nickname prefix, max of {}, matches=({})".format(
-                len(matches), all_names)
+        def nickname_prefix(query):
+            matches = set(self.nicknames_with_prefix(query, view))
+            if len(matches):
+                all_names = ",".join(map(lambda x: x.name_na, matches))
+                return self.pickBestMonster(matches), None, \
+                    "Nickname prefix, max of {}, matches=({})".format(len(matches), all_names)
 
         # prefix search for full name, take max id
-        for nickname, m in self.all_entries.items():
-            if (m.name_na.lower().startswith(query) or m.name_jp.lower().startswith(query)):
-                matches.add(m)
-        if len(matches):
-            return self.pickBestMonster(matches), None, "Full name, max of {}".format(len(matches))
+        def full_name_prefix(query):
+            matches = set(self.names_with_prefix(query, view))
+            if len(matches):
+                return self.pickBestMonster(matches), None, "Full name, max of {}".format(
+                    len(matches))
 
         # for nicknames with 2 names, prefix search 2nd word, take max id
-        if query in self.two_word_entries:
-            return self.two_word_entries[query], None, "Second-word nickname prefix, max of {}".format(len(matches))
+        def second_word_nickname_prefix(query):
+            m = self.get_entry(self.two_word_entries, self.two_word_entry_candidates, query,
+                               accepted)
+            if m is not None:
+                # Nothing matched in the earlier tiers
+                return m, None, "Second-word nickname prefix, max of 0"
 
         # TODO: refactor 2nd search characteristcs for 2nd word
 
+        # Shared by both full name contains tiers
+        name_matches = {}
+
+        def names_containing(query):
+            if query not in name_matches:
+                name_matches[query] = self.monster_ids_with_name_containing(query)
+            return name_matches[query]
+
         # full name contains on nickname, take max id
-        for nickname, m in self.all_entries.items():
-            if (query in m.name_na.lower() or query in m.name_jp.lower()):
-                matches.add(m)
-        if len(matches):
-            return self.pickBestMonster(matches), None, 'Full name match on nickname, max of {}'.format(
-                len(matches))
+        def name_contains_on_nickname(query):
+            holder_ids = view.entry_holder_ids if view else self.entry_holder_ids
+            matches = {self.monster_no_to_named_monster[m_id] for m_id in names_containing(query)
+                       if m_id in holder_ids}
+            if len(matches):
+                return self.pickBestMonster(matches), None, \
+                    'Full name match on nickname, max of {}'.format(len(matches))
 
         # full name contains on full monster list, take max id
-
-        for m in self.all_monsters:
-            if (query in m.name_na.lower() or query in m.name_jp.lower()):
-                matches.add(m)
-        if len(matches):
-            return self.pickBestMonster(matches), None, 'Full name match on full list, max of {}'.format(
-                len(matches))
+        def name_contains(query):
+            matches = {self.monster_no_to_named_monster[m_id] for m_id in names_containing(query)
+                       if accepted is None or m_id in accepted}
+            if len(matches):
+                return self.pickBestMonster(matches), None, \
+                    'Full name match on full list, max of {}'.format(len(matches))
+
+        # kana/romaji spelling of a JP name, take max id
+        def reading(query):
+            matches = {self.monster_no_to_named_monster[m_id]
+                       for m_id in self.monster_ids_with_reading(query)
+                       if accepted is None or m_id in accepted}
+            if len(matches):
+                return self.pickBestMonster(matches), None, 'Reading match, max of {}'.format(
+                    len(matches))
 
         # No decent matches. Try near hits on nickname instead
-        matches = difflib.get_close_matches(query, self.all_entries.keys(), n=1, cutoff=.8)
-        if len(matches):
-            match = matches[0]
-            return self.all_entries[match], None, 'Close nickname match ({})'.format(match)
+        def close_nickname(query):
+            accept = None
+            if accepted is not None:
+                accept = lambda k: self.get_entry(
+                    self.all_entries, self.entry_candidates, k, accepted) is not None
+            match = self.nickname_matcher.closest(query, self.nickname_fuzzy_cutoff, accept)
+            if match:
+                m = self.get_entry(self.all_entries, self.entry_candidates, match, accepted)
+                return m, None, 'Close nickname match ({})'.format(match)
 
         # Still no decent matches. Try near hits on full name instead
-        matches = difflib.get_close_matches(
-            query, self.all_na_name_to_monsters.keys(), n=1, cutoff=.9)
-        if len(matches):
-            match = matches[0]
-            return self.all_na_name_to_monsters[match], None, 'Close name match ({})'.format(match)
+        def close_name(query):
+            accept = None
+            if accepted is not None:
+                accept = lambda k: self.get_entry(
+                    self.all_na_name_to_monsters, self.na_name_candidates, k, accepted) is not None
+            match = self.na_name_matcher.closest(query, self.name_fuzzy_cutoff, accept)
+            if match:
+                m = self.get_entry(self.all_na_name_to_monsters, self.na_name_candidates, match,
+                                   accepted)
+                return m, None, 'Close name match ({})'.format(match)
+
+        return [id_lookup, exact_nickname, too_short, space_nickname_prefix, nickname_prefix,
+                full_name_prefix, second_word_nickname_prefix, name_contains_on_nickname,
+                name_contains, reading, close_nickname, close_name]
+
+    def search_ranked(self, query, k=5):
+        """Get up to k (NamedMonster, tier) pairs for query, best first.
+
+        Tiers are tried in the same order as find_monster, and monsters within a tier are ranked
+        like pickBestMonster. Each tier streams its matches through a heap holding only as many
+        as are still needed, and later tiers are skipped once k monsters are found.
+        """
+        return self._search_ranked(query, k)
 
-        # couldn't find anything
-        return None, "Could not find a match for: " + query, None
+    def _search_ranked(self, query, k, view=None):
+        accepted = view.accepted_ids if view else None
+        query = rpadutils.rmdiacritics(query).lower().strip()
+
+        if query.isdigit():
+            m = self.get_entry(self.monster_no_na_to_named_monster, self.monster_no_na_candidates,
+                               int(query), accepted)
+            return [(m, 'ID lookup')] if m is not None and k > 0 else []
+
+        name_ids = None
+
+        def name_matches():
+            nonlocal name_ids
+            if name_ids is None:
+                name_ids = self.monster_ids_with_name_containing(query)
+            return name_ids
+
+        def close_matches(matcher, entries, candidates, cutoff):
+            accept = None
+            if accepted is not None:
+                accept = lambda key: self.get_entry(entries, candidates, key, accepted) is not None
+            for key in matcher.close_matches(query, cutoff, accept):
+                yield self.get_entry(entries, candidates, key, accepted)
+
+        holder_ids = view.entry_holder_ids if view else self.entry_holder_ids
+        tiers = [
+            ('Exact nickname', lambda: [
+                self.get_entry(self.all_entries, self.entry_candidates, query, accepted)]),
+            ('Space nickname prefix', lambda: self.nicknames_with_prefix(query + ' ', view)),
+            ('Nickname prefix', lambda: self.nicknames_with_prefix(query, view)),
+            ('Full name', lambda: self.names_with_prefix(query, view)),
+            ('Second-word nickname prefix', lambda: [
+                self.get_entry(self.two_word_entries, self.two_word_entry_candidates, query,
+                               accepted)]),
+            ('Full name match on nickname', lambda: (
+                self.monster_no_to_named_monster[m_id] for m_id in name_matches()
+                if m_id in holder_ids)),
+            ('Full name match on full list', lambda: (
+                self.monster_no_to_named_monster[m_id] for m_id in name_matches()
+                if accepted is None or m_id in accepted)),
+            ('Reading match', lambda: (
+                self.monster_no_to_named_monster[m_id]
+                for m_id in self.monster_ids_with_reading(query)
+                if accepted is None or m_id in accepted)),
+            ('Close nickname match', lambda: close_matches(
+                self.nickname_matcher, self.all_entries, self.entry_candidates,
+                self.nickname_fuzzy_cutoff)),
+            ('Close name match', lambda: close_matches(
+                self.na_name_matcher, self.all_na_name_to_monsters, self.na_name_candidates,
+                self.name_fuzzy_cutoff)),
+        ]
+
+        contains_jp = rpadutils.containsJp(query)
+        if len(query) < (2 if contains_jp else 4):
+            # Too short for anything but an exact nickname, same as find_monster
+            tiers = tiers[:1]
+
+        results = []
+        found_ids = set()
+        for tier, matches in tiers:
+            room = k - len(results)
+            if room <= 0:
+                break
+            heap = []
+            heap_ids = set()
+            for nm in matches():
+                if nm is None or nm.monster_id in found_ids or nm.monster_id in heap_ids:
+                    continue
+                heap_ids.add(nm.monster_id)
+                item = ((not nm.is_low_priority, nm.rarity, nm.monster_no_na), nm.monster_id, nm)
+                if len(heap) < room:
+                    heapq.heappush(heap, item)
+                else:
+                    heapq.heappushpop(heap, item)
+            for _, m_id, nm in sorted(heap, reverse=True):
+                results.append((nm, tier))
+                found_ids.add(m_id)
+        return results
 
     def find_monster2(self, query):
         """Search with alternative method for resolving prefixes.
@@ -1378,18 +2632,26 @@ class MonsterIndex(object):
         Follows a similar logic to the regular id but after each check, will remove any potential match that doesn't
         contain every single specified prefix.
         """
+        return self._find_monster2(query)
+
+    def _find_monster2(self, query, view=None):
+        accepted = view.accepted_ids if view else None
+        all_prefixes = view.all_prefixes if view else self.all_prefixes
+
         query = rpadutils.rmdiacritics(query).lower().strip()
         # id search
         if query.isdigit():
-            m = self.monster_no_na_to_named_monster.get(int(query))
+            m = self.get_entry(self.monster_no_na_to_named_monster, self.monster_no_na_candidates,
+                               int(query), accepted)
             if m is None:
                 return None, 'Looks like a monster ID but was not found', None
             else:
                 return m, None, "ID lookup"
 
         # handle exact nickname match
-        if query in self.all_entries:
-            return self.all_entries[query], None, "Exact nickname"
+        m = self.get_entry(self.all_entries, self.entry_candidates, query, accepted)
+        if m is not None:
+            return m, None, "Exact nickname"
 
         contains_jp = rpadutils.containsJp(query)
         if len(query) < 2 and contains_jp:
@@ -1403,7 +2665,7 @@ class MonsterIndex(object):
         parts_of_query = query.split()
         new_query = ''
         for i, part in enumerate(parts_of_query):
-            if part in self.all_prefixes:
+            if part in all_prefixes:
                 query_prefixes.append(part)
             else:
                 new_query = ' '.join(parts_of_query[i:])
@@ -1411,39 +2673,40 @@ class MonsterIndex(object):
 
         # if we don't have any prefixes, then default to using the regular id lookup
         if len(query_prefixes) < 1:
-            return self.find_monster(query)
+            return self._find_monster(query, view)
 
-        matches = PotentialMatches()
+        # only monsters with every prefix can match, so the name checks below only look at those
+        query_mask = self.prefixes_mask(query_prefixes)
+        prefixed_ids = self.monster_ids_with_prefixes(query_prefixes)
+        matches = PotentialMatches(accepted)
 
         # first try to get matches from nicknames
-        for nickname, m in self.all_entries.items():
-            if new_query in nickname:
-                matches.add(m)
-        matches.remove_potential_matches_without_all_prefixes(query_prefixes)
+        entry_keys_by_id = view.entry_keys_by_id if view else self.entry_keys_by_id
+        for m_id in prefixed_ids:
+            if any(new_query in nickname for nickname in entry_keys_by_id.get(m_id, ())):
+                matches.add(self.monster_no_to_named_monster[m_id])
 
         # if we don't have any candidates yet, pick a new method
         if not matches.length():
             # try matching on exact names next
-            for nickname, m in self.all_na_name_to_monsters.items():
-                if new_query in m.name_na.lower() or new_query in m.name_jp.lower():
-                    matches.add(m)
-            matches.remove_potential_matches_without_all_prefixes(query_prefixes)
+            holder_ids = view.na_name_holder_ids if view else self.na_name_holder_ids
+            for m_id in self.monster_ids_with_name_containing(new_query) & prefixed_ids:
+                if m_id in holder_ids:
+                    matches.add(self.monster_no_to_named_monster[m_id])
 
         # check for exact match on pantheon name but only if needed
         if not matches.length():
-            for pantheon in self.all_pantheon_nicknames:
-                if new_query == pantheon.lower():
-                    matches.get_monsters_from_potential_pantheon_match(pantheon, self.pantheon_nick_to_name,
-                                                                       self.pantheons)
-            matches.remove_potential_matches_without_all_prefixes(query_prefixes)
+            for pantheon in self.pantheon_nicknames_equal_to(new_query):
+                matches.get_monsters_from_potential_pantheon_match(
+                    pantheon, self.pantheon_nick_to_name, self.pantheons)
+            matches.remove_potential_matches_without_all_prefixes(query_mask)
 
         # check for any match on pantheon name, again but only if needed
         if not matches.length():
-            for pantheon in self.all_pantheon_nicknames:
-                if new_query in pantheon.lower():
-                    matches.get_monsters_from_potential_pantheon_match(pantheon, self.pantheon_nick_to_name,
-                                                                       self.pantheons)
-            matches.remove_potential_matches_without_all_prefixes(query_prefixes)
+            for pantheon in self.pantheon_nicknames_containing(new_query):
+                matches.get_monsters_from_potential_pantheon_match(
+                    pantheon, self.pantheon_nick_to_name, self.pantheons)
+            matches.remove_potential_matches_without_all_prefixes(query_mask)
 
         if matches.length():
             return matches.pick_best_monster(), None, None
@@ -1453,27 +2716,307 @@ class MonsterIndex(object):
         return max(named_monster_list, key=lambda x: (not x.is_low_priority, x.rarity, x.monster_no_na))
 
 
+class FuzzyMatcher(object):
+    """Finds the string closest to a query, like difflib.get_close_matches(n=1).
+
+    Instead of scoring every string, candidates must share enough of the query's character
+    bigrams to possibly reach the cutoff (found through posting lists), then pass difflib's
+    cheap upper bounds before their ratio is computed. Results are the same as difflib's.
+    """
+
+    def __init__(self, keys):
+        self.keys = list(keys)
+        self.key_lens = array.array('i', (len(k) for k in self.keys))
+        postings = defaultdict(lambda: array.array('i'))
+        for i, k in enumerate(self.keys):
+            for gram in set(ngrams(k, 2)):
+                postings[gram].append(i)
+        self.bigrams = dict(postings)
+
+    def closest(self, query: str, cutoff: float, accept=None):
+        """Get the best key with a ratio of at least cutoff, that accept(key) allows if set."""
+        for key in self.close_matches(query, cutoff, accept):
+            return key
+        return None
+
+    def close_matches(self, query: str, cutoff: float, accept=None):
+        """Yield the keys with a ratio of at least cutoff that accept(key) allows, best first."""
+        query_len = len(query)
+        need = min_shared_bigrams(query, cutoff)
+        if need:
+            counts = Counter()
+            for gram in set(ngrams(query, 2)):
+                counts.update(self.bigrams.get(gram, ()))
+            candidates = [i for i, n in counts.items() if n >= need]
+        else:
+            # Low cutoffs and short strings can match without sharing a bigram, check them all
+            candidates = range(len(self.keys))
+
+        scored = []
+        s = difflib.SequenceMatcher()
+        s.set_seq2(query)
+        for i in candidates:
+            key_len = self.key_lens[i]
+            # Two empty strings are a perfect match, like in difflib
+            total_len = query_len + key_len
+            if total_len and 2.0 * min(query_len, key_len) / total_len < cutoff:
+                continue
+            s.set_seq1(self.keys[i])
+            if s.quick_ratio() < cutoff:
+                continue
+            ratio = s.ratio()
+            if ratio >= cutoff:
+                scored.append((ratio, self.keys[i]))
+
+        # Same tie break as get_close_matches, the greater key wins
+        scored.sort(reverse=True)
+        for _, key in scored:
+            if accept is None or accept(key):
+                yield key
+
+
+def min_shared_bigrams(query: str, cutoff: float):
+    """The fewest distinct bigrams of query that a string with a ratio of at least cutoff contains.
+
+    A ratio of 2*M/T needs M matching characters (T is both lengths added up). They come in
+    blocks, separated by at least one unmatched character, so there are at most T - 2*M + 1
+    blocks and at least 3*M - T - 1 of the query's bigrams fall inside them. T is smallest for
+    the shortest string passing the length bound. Bigrams can repeat, so the count is of
+    distinct ones: as few as the most repeated bigrams need to cover that many.
+    """
+    query_len = len(query)
+    min_total_len = 2.0 * query_len / (2 - cutoff)
+    # Rounded down a little so float error can't make the bound too strict
+    min_shared = math.ceil((1.5 * cutoff - 1) * min_total_len - 1 - 1e-9)
+    need = 0
+    for n in sorted(Counter(ngrams(query, 2)).values(), reverse=True):
+        if min_shared <= 0:
+            break
+        min_shared -= n
+        need += 1
+    return need
+
+
+def kana_to_hiragana(text: str):
+    return text.translate(KATAKANA_TO_HIRAGANA)
+
+
+def name_readings(name_jp: str):
+    """Get the readings a JP name can be searched by.
+
+    That's the name and each of its ・ separated parts, with katakana folded to hiragana,
+    plus their romaji where they're all kana. Long vowel marks are dropped from the romaji.
+    """
+    readings = set()
+    name = name_jp.lower().replace('＝', '')
+    if not rpadutils.containsJp(name):
+        return readings
+    parts = [name.replace('・', ' ')]
+    if '・' in name:
+        parts.extend(name.split('・'))
+    for part in parts:
+        part = part.strip()
+        if not part:
+            continue
+        readings.add(kana_to_hiragana(part))
+        roma = romkan.to_roma(part).replace('-', '')
+        if roma != part and not rpadutils.containsJp(roma):
+            readings.add(roma)
+    return readings
+
+
+def query_reading(query: str):
+    """Normalize a (lowercased) query the way name_readings normalizes names."""
+    query = query.replace('＝', '').replace('・', ' ').strip()
+    if rpadutils.containsJp(query):
+        return kana_to_hiragana(query)
+    return query.replace('-', '')
+
+
+def ngrams(text: str, n: int):
+    return (text[i:i + n] for i in range(len(text) - n + 1))
+
+
+def prefix_range(sorted_keys: list, prefix: str):
+    """Get the [lo, hi) indexes of the strings in sorted_keys starting with prefix."""
+    lo = bisect.bisect_left(sorted_keys, prefix)
+    if not prefix or ord(prefix[-1]) == sys.maxunicode:
+        hi = len(sorted_keys)
+        while hi > lo and not sorted_keys[hi - 1].startswith(prefix):
+            hi -= 1
+        return lo, hi
+    # Everything starting with prefix sorts before the prefix with its last character bumped
+    hi = bisect.bisect_left(sorted_keys, prefix[:-1] + chr(ord(prefix[-1]) + 1), lo)
+    return lo, hi
+
+
+def add_ranked_entry(entries: dict, candidates: dict, key, nm):
+    """Make nm the entry for key, remembering any NamedMonster it displaces in candidates."""
+    prev = entries.get(key)
+    if prev is not None and prev is not nm:
+        candidates.setdefault(key, [prev]).insert(0, nm)
+    entries[key] = nm
+
+
+def patch_ranked_entries(entries: dict, candidates: dict, old_nms: list, new_nms: list,
+                         rank: dict, keys_of, extra_keys=(), top_of=None):
+    """Copy a ranked map (see add_ranked_entry), redoing only the keys old_nms or new_nms want.
+
+    new_nms replace old_nms; rank gives every NamedMonster's place in the index, higher is
+    better. top_of(key), if set, gives a NamedMonster that beats all the others for key.
+    """
+    entries = dict(entries)
+    candidates = dict(candidates)
+    replaced_ids = {nm.monster_id for nm in old_nms}
+
+    new_holders = defaultdict(list)
+    for nm in new_nms:
+        for key in keys_of(nm):
+            new_holders[key].append(nm)
+
+    keys = set(extra_keys)
+    keys.update(new_holders.keys())
+    for nm in old_nms:
+        keys.update(keys_of(nm))
+
+    for key in keys:
+        holders = candidates.get(key) or ([entries[key]] if key in entries else [])
+        holders = [nm for nm in holders if nm.monster_id not in replaced_ids and key in keys_of(nm)]
+        holders.extend(new_holders.get(key, []))
+        ranked = sorted(set(holders), key=lambda nm: rank[nm.monster_id], reverse=True)
+        top = top_of(key) if top_of else None
+        if top is not None:
+            ranked = [top] + [nm for nm in ranked if nm is not top]
+
+        if ranked:
+            entries[key] = ranked[0]
+        else:
+            entries.pop(key, None)
+        if len(ranked) > 1:
+            candidates[key] = ranked
+        else:
+            candidates.pop(key, None)
+    return entries, candidates
+
+
+class MonsterIndexView(object):
+    """A MonsterIndex restricted to the NamedMonsters accepted by a filter.
+
+    The filter runs once over the NamedMonsters (which carry on_na/on_jp/on_kr) to get the
+    set of accepted ids. Everything else is shared with the index, and lookups skip or
+    fall back past monsters outside the set, so results match an index built with an
+    accept_filter that accepts the same monsters.
+    """
+
+    def __init__(self, index: MonsterIndex, named_monster_filter):
+        self.index = index
+        self.accepted_ids = frozenset(nm.monster_id for nm in index.all_monsters
+                                      if named_monster_filter(nm))
+        self.all_prefixes = set()
+        for nm in index.all_monsters:
+            if nm.monster_id in self.accepted_ids:
+                self.all_prefixes.update(nm.prefixes)
+
+        self._all_entries = None
+        self._two_word_entries = None
+        self._all_monsters = None
+        self._monster_no_to_named_monster = None
+        self._entry_keys_by_id = None
+        self._entry_holder_ids = None
+        self._na_name_holder_ids = None
+
+    def find_monster(self, query):
+        return self.index._find_monster(query, self)
+
+    def find_monsters(self, queries):
+        return self.index._find_monsters(queries, self)
+
+    def find_monster2(self, query):
+        return self.index._find_monster2(query, self)
+
+    def search_ranked(self, query, k=5):
+        return self.index._search_ranked(query, k, self)
+
+    @property
+    def entry_keys_by_id(self):
+        if self._entry_keys_by_id is None:
+            self._entry_keys_by_id = defaultdict(list)
+            for nickname, nm in self.index.iter_entries(
+                    self.index.all_entries, self.index.entry_candidates, self.accepted_ids):
+                self._entry_keys_by_id[nm.monster_id].append(nickname)
+            self._entry_keys_by_id = dict(self._entry_keys_by_id)
+        return self._entry_keys_by_id
+
+    @property
+    def entry_holder_ids(self):
+        if self._entry_holder_ids is None:
+            self._entry_holder_ids = frozenset(nm.monster_id for _, nm in self.index.iter_entries(
+                self.index.all_entries, self.index.entry_candidates, self.accepted_ids))
+        return self._entry_holder_ids
+
+    @property
+    def na_name_holder_ids(self):
+        if self._na_name_holder_ids is None:
+            entries = self.index.iter_entries(self.index.all_na_name_to_monsters,
+                                              self.index.na_name_candidates, self.accepted_ids)
+            self._na_name_holder_ids = frozenset(nm.monster_id for _, nm in entries)
+        return self._na_name_holder_ids
+
+    def pickBestMonster(self, named_monster_list):
+        return self.index.pickBestMonster(named_monster_list)
+
+    # The rest is only for callers that poke at the index directly, built on first use
+
+    @property
+    def all_entries(self):
+        if self._all_entries is None:
+            self._all_entries = dict(self.index.iter_entries(
+                self.index.all_entries, self.index.entry_candidates, self.accepted_ids))
+        return self._all_entries
+
+    @property
+    def two_word_entries(self):
+        if self._two_word_entries is None:
+            self._two_word_entries = dict(self.index.iter_entries(
+                self.index.two_word_entries, self.index.two_word_entry_candidates,
+                self.accepted_ids))
+        return self._two_word_entries
+
+    @property
+    def all_monsters(self):
+        if self._all_monsters is None:
+            self._all_monsters = [nm for nm in self.index.all_monsters
+                                  if nm.monster_id in self.accepted_ids]
+        return self._all_monsters
+
+    @property
+    def monster_no_to_named_monster(self):
+        if self._monster_no_to_named_monster is None:
+            self._monster_no_to_named_monster = {
+                m_id: nm for m_id, nm in self.index.monster_no_to_named_monster.items()
+                if m_id in self.accepted_ids}
+        return self._monster_no_to_named_monster
+
+
 class PotentialMatches(object):
-    def __init__(self):
+    def __init__(self, accepted=None):
         self.match_list = set()
+        # Monster ids allowed by the view being searched, or None for everything
+        self.accepted = accepted
 
     def add(self, m):
-        self.match_list.add(m)
+        if self.accepted is None or m.monster_id in self.accepted:
+            self.match_list.add(m)
 
     def update(self, monster_list):
-        self.match_list.update(monster_list)
+        for m in monster_list:
+            self.add(m)
 
     def length(self):
         return len(self.match_list)
 
-    def remove_potential_matches_without_all_prefixes(self, query_prefixes):
-        to_remove = set()
-        for m in self.match_list:
-            for prefix in query_prefixes:
-                if prefix not in m.prefixes:
-                    to_remove.add(m)
-                    break
-        self.match_list.difference_update(to_remove)
+    def remove_potential_matches_without_all_prefixes(self, query_mask):
+        self.match_list = {m for m in self.match_list if m.prefix_mask & query_mask == query_mask}
 
     def get_monsters_from_potential_pantheon_match(self, pantheon, pantheon_nick_to_name, pantheons):
         full_name = pantheon_nick_to_name[pantheon]
@@ -1503,7 +3046,11 @@ class NamedMonsterGroup(object):
         if '-' in self.computed_basename:
             self.computed_basenames.add(self.computed_basename.replace('-', ' '))
 
-        self.basenames = basename_overrides or self.computed_basenames
+        self.basenames = frozenset(basename_overrides or self.computed_basenames)
+
+        # Compute extra basenames by checking for two-word basenames and using the second half
+        self.two_word_basenames = frozenset(basename.split(' ')[1] for basename in self.basenames
+                                            if len(basename.split(' ')) == 2)
 
     def _compute_monster_basename(self, m: DgMonster):
         basename = m.name_na.lower()
@@ -1569,6 +3116,14 @@ class NamedMonsterGroup(object):
 
 
 class NamedMonster(object):
+    # There's one of these per monster in every index, so skip the per-instance __dict__
+    __slots__ = ('monster_id', 'monster_no_na', 'monster_no_jp', 'base_monster_no',
+                 'base_monster_no_na', 'group_basenames', 'prefixes', 'prefix_mask', 'series',
+                 'on_na', 'on_jp', 'on_kr', 'is_low_priority', 'group_size', 'rarity', 'name_na',
+                 'name_jp', 'monster_basename', 'group_computed_basename', 'extra_nicknames',
+                 'two_word_basenames', 'roma_subname', 'final_nicknames',
+                 'final_two_word_nicknames')
+
     def __init__(self, monster: DgMonster, monster_group: NamedMonsterGroup, prefixes: set, extra_nicknames: set):
         # Must not hold onto monster or monster_group!
 
@@ -1584,10 +3139,17 @@ class NamedMonster(object):
         # This stuff is important for nickname generation
         self.group_basenames = monster_group.basenames
         self.prefixes = prefixes
+        # Bits of prefixes, set by the MonsterIndex
+        self.prefix_mask = 0
 
         # Pantheon
         self.series = monster.series.name if monster.series else None
 
+        # Which servers the monster is out on, for filtering views of the index
+        self.on_na = monster.on_na
+        self.on_jp = monster.on_jp
+        self.on_kr = monster.on_kr
+
         # Data used to determine how to rank the nicknames
         self.is_low_priority = monster_group.is_low_priority or monster.is_equip
         self.group_size = monster_group.group_size
@@ -1606,35 +3168,38 @@ class NamedMonster(object):
         if self.monster_basename in ('ana', 'ace'):
             self.prefixes.add(self.monster_basename)
 
-        # Compute extra basenames by checking for two-word basenames and using the second half
-        self.two_word_basenames = set()
-        for basename in self.group_basenames:
-            basename_words = basename.split(' ')
-            if len(basename_words) == 2:
-                self.two_word_basenames.add(basename_words[1])
+        self.two_word_basenames = monster_group.two_word_basenames
+        self.roma_subname = monster.roma_subname
+
+        # The nickname strings are interned, so the index entries keyed on them share them too
+        self.final_nicknames = self._compute_final_nicknames()
+        self.final_two_word_nicknames = self._compute_final_two_word_nicknames()
 
-        # The primary result nicknames
-        self.final_nicknames = set()
+    def _compute_final_nicknames(self):
+        """The primary result nicknames"""
         # Set the configured override nicknames
-        self.final_nicknames.update(self.extra_nicknames)
+        final_nicknames = set(self.extra_nicknames)
         # Set the roma subname for JP monsters
-        if monster.roma_subname:
-            self.final_nicknames.add(monster.roma_subname)
+        if self.roma_subname:
+            final_nicknames.add(self.roma_subname)
 
         # For each basename, add nicknames
         for basename in self.group_basenames:
             # Add the basename directly
-            self.final_nicknames.add(basename)
+            final_nicknames.add(basename)
             # Add the prefix plus basename, and the prefix with a space between basename
             for prefix in self.prefixes:
-                self.final_nicknames.add(prefix + basename)
-                self.final_nicknames.add(prefix + ' ' + basename)
+                final_nicknames.add(prefix + basename)
+                final_nicknames.add(prefix + ' ' + basename)
+        return frozenset(sys.intern(n) for n in final_nicknames)
 
-        self.final_two_word_nicknames = set()
+    def _compute_final_two_word_nicknames(self):
+        final_two_word_nicknames = set()
         # Slightly different process for two-word basenames. Does this make sense? Who knows.
         for basename in self.two_word_basenames:
-            self.final_two_word_nicknames.add(basename)
+            final_two_word_nicknames.add(basename)
             # Add the prefix plus basename, and the prefix with a space between basename
             for prefix in self.prefixes:
-                self.final_two_word_nicknames.add(prefix + basename)
-                self.final_two_word_nicknames.add(prefix + ' ' + basename)
+                final_two_word_nicknames.add(prefix + basename)
+                final_two_word_nicknames.add(prefix + ' ' + basename)
+        return frozenset(sys.intern(n) for n in final_two_word_nicknames)
@@ -54,6 +54,14 @@ def lookup_named_monster(query: str):
     return nm, err, debug_info
 
 
+async def lookup_named_monsters(queries: list):
+    """Resolve several queries in one batch, returning {query: (nm, err, debug_info)}."""
+    dg_cog = PADGLOBAL_COG.bot.get_cog('Dadguide')
+    if dg_cog is None:
+        return {query: (None, "cog not loaded", None) for query in queries}
+    return await dg_cog.find_monsters(queries)
+
+
 def monster_no_to_monster(monster_no):
     padinfo_cog = PADGLOBAL_COG.bot.get_cog('PadInfo')
     if padinfo_cog is None:
@@ -655,7 +663,7 @@ class PadGlobal:
 
         if term is None:
             await self.bot.whisper('__**PAD Which Monster**__ *(also check out ^pad / ^padfaq / ^boards / ^glossary)*')
-            msg = self.which_to_text()
+            msg = await self.which_to_text()
             for page in pagify(msg):
                 await self.bot.whisper(box(page))
             return
@@ -705,12 +713,13 @@ class PadGlobal:
             return
         await self._do_send_which(ctx, to_user, name, definition)
 
-    def which_to_text(self):
+    async def which_to_text(self):
         items = list()
         monsters = defaultdict(list)
+        nm_results = await lookup_named_monsters([w for w in self.settings.which() if w.isdigit()])
         for w in self.settings.which():
             if w.isdigit():
-                nm, _, _ = lookup_named_monster(w)
+                nm, _, _ = nm_results[w]
                 name = nm.group_computed_basename.title()
                 m = monster_no_to_monster(nm.monster_id)
                 grp = m.series.name
@@ -41,6 +41,8 @@ Options for <query>
         ^id a ares (spaces work too)
         ^id rd ares (select a specific evo for ares, the red/dark one)
         ^id r/d ares (slashes, spaces work too)
+    <jp name> : Hiragana, katakana or romaji spellings of a JP name all work
+        ^id ぜうす (same as ^id ゼウス or ^id zeusu)
 
 computed nickname list and overrides: https://docs.google.com/spreadsheets/d/1EyzMjvf8ZCQ4K-gJYnNkiZlCEsT9YYI9dUd-T5qCirc/pubhtml
 submit an override suggestion: https://docs.google.com/forms/d/1kJH9Q0S8iqqULwrRqB9dSxMOMebZj6uZjECqi4t9_z0/edit"""
@@ -60,6 +62,9 @@ ORB_SKIN_CB_TEMPLATE = MEDIA_PATH + 'orb_skins/{0:03d}cb.png'
 YT_SEARCH_TEMPLATE = 'https://www.youtube.com/results?search_query={}'
 SKYOZORA_TEMPLATE = 'http://pad.skyozora.com/pets/{}'
 
+# Number of ^id/^id2 lookup results to remember between index refreshes
+LOOKUP_CACHE_SIZE = 2000
+
 
 def get_pdx_url(m):
     return INFO_PDX_TEMPLATE.format(rpadutils.get_pdx_id(m))
@@ -106,6 +111,10 @@ class PadInfo:
         self.index_all = None
         self.index_na = None
 
+        # Lookup results for the current indexes, keyed by (generation, lookup, query, na_only)
+        self.index_generation = 0
+        self.lookup_cache = rpadutils.LruCache(LOOKUP_CACHE_SIZE)
+
         self.menu = Menu(bot)
 
         # These emojis are the keys into the idmenu submenus
@@ -159,8 +168,14 @@ class PadInfo:
         """Refresh the monster indexes."""
         dg_cog = self.bot.get_cog('Dadguide')
         await dg_cog.wait_until_ready()
-        self.index_all = dg_cog.create_index()
-        self.index_na = dg_cog.create_index(lambda m: m.on_na)
+        index_all = dg_cog.create_index()
+        if index_all is self.index_all:
+            # Dadguide is still serving the same snapshot, so the cached lookups are still good
+            return
+        self.index_all = index_all
+        self.index_na = dg_cog.create_index(lambda nm: nm.on_na)
+        self.index_generation += 1
+        self.lookup_cache.clear()
 
     def get_monster_by_no(self, monster_no: int):
         dg_cog = self.bot.get_cog('Dadguide')
@@ -210,6 +225,19 @@ class PadInfo:
         else:
             await self.bot.say(self.makeFailureMsg(err))
 
+    @commands.command(pass_context=True)
+    async def idsearch(self, ctx, *, query: str):
+        """List the best few monsters matching a query, and how they matched"""
+        results = self.index_all.search_ranked(rmdiacritics(query), 8)
+        if not results:
+            await self.bot.say(self.makeFailureMsg('Could not find a match for: ' + query))
+            return
+
+        msg = 'Did you mean:'
+        for nm, tier in results:
+            msg += '\n\tNo. {} {} ({})'.format(nm.monster_no_na, nm.name_na, tier)
+        await self.bot.say(box(msg))
+
     @commands.command(name="evos", pass_context=True)
     async def evos(self, ctx, *, query: str):
         """Monster info (evolutions tab)"""
@@ -371,17 +399,28 @@ class PadInfo:
             await self.bot.say(inline('Too many inputs. Try wrapping your queries in quotes.'))
             return
 
+        # Resolve everything we might need in one batch
+        queries = [left_query, right_query] if right_query else [left_query]
+        combined_query = None
         # Handle a very specific failure case, user typing something like "uuvo ragdra"
         if ' ' not in left_query and right_query is not None and ' ' not in right_query and bad is None:
             combined_query = left_query + ' ' + right_query
-            nm, err, debug_info = self._findMonster(combined_query)
+            queries.append(combined_query)
+        clean_queries = {query: rmdiacritics(query) for query in queries}
+        nm_results = self._findMonsters(list(clean_queries.values()))
+
+        if combined_query:
+            nm, err, debug_info = nm_results[clean_queries[combined_query]]
             if nm and left_query in nm.prefixes:
                 left_query = combined_query
                 right_query = None
 
-        left_m, left_err, _ = self.findMonster(left_query)
+        used_queries = [left_query, right_query] if right_query else [left_query]
+        results = self._recordLookups({query: clean_queries[query] for query in used_queries},
+                                      nm_results)
+        left_m, left_err, _ = results[left_query]
         if right_query:
-            right_m, right_err, _ = self.findMonster(right_query)
+            right_m, right_err, _ = results[right_query]
         else:
             right_m, right_err, = left_m, left_err
 
@@ -454,6 +493,16 @@ class PadInfo:
             self.settings.setEmojiServers(emoji_servers.split(','))
         await self.bot.say(inline('Set {} servers'.format(len(self.settings.emojiServers()))))
 
+    @padinfo.command(pass_context=True)
+    @checks.is_owner()
+    async def lookupcachestats(self, ctx):
+        """Show how well the ^id/^id2 lookup cache is doing"""
+        cache = self.lookup_cache
+        msg = 'Lookup cache: {}/{} entries, {} hits, {} misses, hit rate {:.1%}'.format(
+            len(cache), cache.max_size, cache.hits, cache.misses, cache.hit_rate())
+        msg += ' (index generation {})'.format(self.index_generation)
+        await self.bot.say(inline(msg))
+
     def get_emojis(self):
         server_ids = self.settings.emojiServers()
         return [e for s in self.bot.servers if s.id in server_ids for e in s.emojis]
@@ -464,20 +513,36 @@ class PadInfo:
         return box(msg)
 
     def findMonster(self, query, na_only=False):
-        query = rmdiacritics(query)
-        nm, err, debug_info = self._findMonster(query, na_only)
+        return self.findMonsters([query], na_only)[query]
 
-        monster_no = nm.monster_id if nm else -1
-        self.historic_lookups[query] = monster_no
-        dataIO.save_json(self.historic_lookups_file_path, self.historic_lookups)
+    def findMonsters(self, queries, na_only=False):
+        """Look up several queries at once, returning {query: (m, err, debug_info)}."""
+        clean_queries = {query: rmdiacritics(query) for query in queries}
+        nm_results = self._findMonsters(list(clean_queries.values()), na_only)
+        return self._recordLookups(clean_queries, nm_results)
 
-        m = self.get_monster_by_no(nm.monster_id) if nm else None
+    def _recordLookups(self, clean_queries, nm_results):
+        """Save {query: clean query} to the lookup history and get their results."""
+        results = {}
+        for query, clean_query in clean_queries.items():
+            nm, err, debug_info = nm_results[clean_query]
 
-        return m, err, debug_info
+            monster_no = nm.monster_id if nm else -1
+            self.historic_lookups[clean_query] = monster_no
+
+            m = self.get_monster_by_no(nm.monster_id) if nm else None
+            results[query] = m, err, debug_info
+
+        dataIO.save_json(self.historic_lookups_file_path, self.historic_lookups)
+        return results
 
     def _findMonster(self, query, na_only=False):
+        return self._findMonsters([query], na_only)[query]
+
+    def _findMonsters(self, queries, na_only=False):
         monster_index = self.index_na if na_only else self.index_all
-        return monster_index.find_monster(query)
+        return self._cachedLookups(monster_index, 'id', monster_index.find_monsters, queries,
+                                   na_only)
 
     def findMonster2(self, query, na_only=False):
         query = rmdiacritics(query)
@@ -493,7 +558,39 @@ class PadInfo:
 
     def _findMonster2(self, query, na_only=False):
         monster_index = self.index_na if na_only else self.index_all
-        return monster_index.find_monster2(query)
+
+        def find_monsters2(queries):
+            return {query: monster_index.find_monster2(query) for query in queries}
+
+        return self._cachedLookups(monster_index, 'id2', find_monsters2, [query], na_only)[query]
+
+    def _cachedLookups(self, monster_index, lookup, find_fn, queries, na_only):
+        """Resolve queries with find_fn(queries) -> {query: result}, skipping cached ones."""
+        # Normalized the same way the index does it, so equivalent queries share an entry
+        keys = {query: (self.index_generation, lookup, rmdiacritics(query).lower().strip(), na_only)
+                for query in queries}
+        cached_results = {}
+        missed = []
+        for query, key in keys.items():
+            result = self.lookup_cache.get(key)
+            if result is None:
+                missed.append(query)
+            else:
+                cached_results[query] = result
+
+        if missed:
+            for query, (nm, err, debug_info) in find_fn(missed).items():
+                result = (nm.monster_id if nm else None, err, debug_info)
+                self.lookup_cache.put(keys[query], result)
+                cached_results[query] = result
+
+        results = {}
+        for query, (monster_id, err, debug_info) in cached_results.items():
+            nm = None
+            if monster_id is not None:
+                nm = monster_index.monster_no_to_named_monster[monster_id]
+            results[query] = nm, err, debug_info
+        return results
 
 
 def setup(bot):
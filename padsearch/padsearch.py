@@ -514,18 +514,8 @@ class SearchConfig(object):
             text = 'damage taken by {}%'.format(self.shield)
             self.filters.append(lambda m, t=text: t in m.search.active_desc)
 
-        if self.atk:
-            self.filters.append(lambda m: m.search.atk and m.search.atk >= self.atk)
-
-        if self.hp:
-            self.filters.append(lambda m: m.search.hp and m.search.hp >= self.hp)
-
-        if self.rcv:
-            self.filters.append(lambda m: m.search.rcv and m.search.rcv >= self.rcv)
-
-        if self.weighted:
-            self.filters.append(
-                lambda m: m.search.weighted_stats and m.search.weighted_stats >= self.weighted)
+        # Stat filters run against the whole stat table at once; see stat_filtered_monsters
+        self.has_stat_filters = any([self.hp, self.atk, self.rcv, self.weighted])
 
         # Multiple
         if self.active:
@@ -603,9 +593,19 @@ class SearchConfig(object):
                 filters.append(lambda m, t=text: t not in m.search.name)
             self.filters.append(self.or_filters(filters))
 
-        if not self.filters:
+        if not self.filters and not self.has_stat_filters:
             raise rpadutils.ReportableError('You need to specify at least one filter')
 
+    def stat_filtered_monsters(self, database):
+        """Monsters passing the hp/atk/rcv/weighted filters, in table order."""
+        if not self.has_stat_filters:
+            return database.get_all_monsters()
+        # Same level as MonsterSearchHelper's stats
+        monster_ids = database.stat_table.monster_ids_with_min_stats(
+            lv=110, hp=self.hp or None, atk=self.atk or None, rcv=self.rcv or None,
+            weighted=self.weighted or None)
+        return database.get_monsters(monster_ids)
+
     def check_filters(self, m):
         for f in self.filters:
             if not f(m):
@@ -655,7 +655,7 @@ class PadSearch:
                 # If it still failed, raise the original exception
                 raise ex
         dg_cog = self.bot.get_cog('Dadguide')
-        monsters = dg_cog.database.get_all_monsters()
+        monsters = config.stat_filtered_monsters(dg_cog.database)
         matched_monsters = list(filter(config.check_filters, monsters))
 
         # Removing entry with names that have gems in it
@@ -98,18 +98,22 @@ class PadTwitch:
         while True:
             received = self.stream.twitch_receive_messages()
             if received:
+                # Resolve every monster lookup in the batch at once
+                actions = (self.get_monster_action(m['message']) for m in received)
+                queries = [a[1] for a in actions if a]
+                monsters = self.lookup_monsters(queries)
                 for m in received:
-                    self.process_user_message(**m)
+                    self.process_user_message(monsters=monsters, **m)
                 time.sleep(.1)
 
-    def process_user_message(self, message, channel, username):
-        for action_name, action_fn in self.monster_actions.items():
-            if message.startswith(action_name):
-                query = message[len(action_name):]
-                m = self.lookup_monster(query)
-                msg = action_fn(channel, username, m) if m else 'no matches for ' + query
-                self.stream.send_chat_message(channel, msg)
-                return
+    def process_user_message(self, message, channel, username, monsters=None):
+        monster_action = self.get_monster_action(message)
+        if monster_action:
+            action_fn, query = monster_action
+            m = monsters[query] if monsters and query in monsters else self.lookup_monster(query)
+            msg = action_fn(channel, username, m) if m else 'no matches for ' + query
+            self.stream.send_chat_message(channel, msg)
+            return
 
         for action_name, action_fn in self.actions.items():
             if message.startswith(action_name):
@@ -122,12 +126,24 @@ class PadTwitch:
                 self.stream.send_chat_message(channel, command_response)
                 return
 
+    def get_monster_action(self, message):
+        """Get the (action_fn, query) of a monster lookup message, or None if it isn't one."""
+        for action_name, action_fn in self.monster_actions.items():
+            if message.startswith(action_name):
+                return action_fn, message[len(action_name):]
+        return None
+
     def lookup_monster(self, query):
-        padinfo = self.bot.get_cog('PadInfo')
-        if not padinfo:
-            return None
-        m, _, _ = padinfo.findMonster(query)
-        return m
+        return self.lookup_monsters([query]).get(query)
+
+    def lookup_monsters(self, queries):
+        dg_cog = self.bot.get_cog('Dadguide')
+        if not dg_cog or not queries:
+            return {}
+        # This runs on the stream thread, the lookup itself runs on the bot's loop
+        future = asyncio.run_coroutine_threadsafe(dg_cog.find_monsters(queries), self.bot.loop)
+        return {query: dg_cog.get_monster_by_no(nm.monster_id) if nm else None
+                for query, (nm, _, _) in future.result().items()}
 
     def _get_header(self, m):
         return '{}. {}'.format(m.monster_id_na, m.name_na)
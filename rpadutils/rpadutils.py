@@ -1,12 +1,15 @@
 import asyncio
 import concurrent.futures
+import hashlib
 import inspect
 import json
 import os
 import re
+import threading
 import time
 import unicodedata
 import urllib
+from collections import OrderedDict
 
 import aiohttp
 import backoff
@@ -172,15 +175,104 @@ def readJsonFile(file_path):
         return json.load(f)
 
 
+def cache_metadata_path(file_path):
+    return file_path + '.meta.json'
+
+
+def read_cache_metadata(file_path):
+    """Get the metadata recorded when file_path was downloaded: etag, last_modified and sha256.
+
+    Returns {} if there isn't any, or if file_path has been changed some other way since.
+    """
+    metadata_path = cache_metadata_path(file_path)
+    if not os.path.exists(file_path) or not os.path.exists(metadata_path):
+        return {}
+    try:
+        metadata = readJsonFile(metadata_path)
+    except Exception as ex:
+        print('failed to read cache metadata', metadata_path, ex)
+        return {}
+    stat = os.stat(file_path)
+    if metadata.get('mtime_ns') != stat.st_mtime_ns or metadata.get('size') != stat.st_size:
+        return {}
+    return metadata
+
+
+def write_cache_metadata(file_path, metadata):
+    # Stamped with the file's mtime and size, so a file replaced by something else isn't trusted
+    stat = os.stat(file_path)
+    metadata = dict(metadata, mtime_ns=stat.st_mtime_ns, size=stat.st_size)
+    tmp_metadata_path = cache_metadata_path(file_path) + '.tmp'
+    writeJsonFile(tmp_metadata_path, metadata)
+    os.replace(tmp_metadata_path, cache_metadata_path(file_path))
+
+
+def hash_file(file_path):
+    h = hashlib.sha256()
+    with open(file_path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def cached_file_hash(file_path):
+    """sha256 of file_path, from its download metadata if possible, or None if it doesn't exist."""
+    if not os.path.exists(file_path):
+        return None
+    return read_cache_metadata(file_path).get('sha256') or hash_file(file_path)
+
+
+async def async_cached_request(file_path, file_url, expiry_secs, as_text=False):
+    """Download file_url to file_path if the cached copy has expired.
+
+    Once expired, the copy is revalidated with the ETag/Last-Modified it was served with, and
+    only replaced if the server sends different content. Expiry counts from the last check.
+    Text is stored as utf-8, whatever the server sent. Returns True if file_path changed.
+    """
+    metadata = read_cache_metadata(file_path)
+    last_checked_path = cache_metadata_path(file_path) if metadata else file_path
+    if not should_download(last_checked_path, expiry_secs):
+        return False
+
+    headers = {}
+    if metadata.get('etag'):
+        headers['If-None-Match'] = metadata['etag']
+    if metadata.get('last_modified'):
+        headers['If-Modified-Since'] = metadata['last_modified']
+
+    async with aiohttp.ClientSession() as session:
+        async with session.get(file_url, headers=headers) as resp:
+            if resp.status == 304:
+                print('not modified, keeping ' + file_path)
+                # Rewriting the metadata restarts the expiry
+                write_cache_metadata(file_path, metadata)
+                return False
+            assert resp.status == 200
+            data = (await resp.text()).encode('utf-8') if as_text else await resp.read()
+            new_metadata = {
+                'etag': resp.headers.get('ETag'),
+                'last_modified': resp.headers.get('Last-Modified'),
+                'sha256': hashlib.sha256(data).hexdigest(),
+            }
+
+    changed = new_metadata['sha256'] != cached_file_hash(file_path)
+    if changed:
+        # Write next to the old file and swap it in, so open handles to the old file
+        # (or hard links to it) are never modified.
+        tmp_file_path = file_path + '.tmp'
+        with open(tmp_file_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_file_path, file_path)
+    else:
+        print('same content, keeping ' + file_path)
+    write_cache_metadata(file_path, new_metadata)
+    return changed
+
+
 @backoff.on_exception(backoff.expo, aiohttp.ClientError, max_time=60)
 @backoff.on_exception(backoff.expo, aiohttp.DisconnectedError, max_time=60)
 async def async_cached_dadguide_request(file_path, file_url, expiry_secs):
-    if should_download(file_path, expiry_secs):
-        async with aiohttp.ClientSession() as session:
-            async with session.get(file_url) as resp:
-                assert resp.status == 200
-                with open(file_path, 'wb') as f:
-                    f.write(await resp.read())
+    return await async_cached_request(file_path, file_url, expiry_secs)
 
 
 def writePlainFile(file_path, text_data):
@@ -206,9 +298,7 @@ async def makeAsyncPlainRequest(file_url):
 
 
 async def makeAsyncCachedPlainRequest(file_path, file_url, expiry_secs):
-    if shouldDownload(file_path, expiry_secs):
-        resp = await makeAsyncPlainRequest(file_url)
-        writePlainFile(file_path, resp)
+    await async_cached_request(file_path, file_url, expiry_secs, as_text=True)
     return readPlainFile(file_path)
 
 
@@ -591,6 +681,65 @@ def strip_right_multiline(txt: str):
     return '\n'.join([x.strip() for x in txt.splitlines()])
 
 
+class LruCache(object):
+    """A mapping holding at most max_size entries, evicting the least recently used.
+
+    Tracks hits and misses so callers can report how well the cache is doing.
+    A max_size of 0 disables caching. Safe to share between the event loop and worker threads.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key, value):
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            self._evict()
+
+    def resize(self, max_size: int):
+        with self._lock:
+            self.max_size = max_size
+            self._evict()
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def hit_rate(self):
+        lookups = self.hits + self.misses
+        return self.hits / lookups if lookups else 0.0
+
+    def _evict(self):
+        while len(self._data) > max(self.max_size, 0):
+            self._data.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+
 # This was overwritten by voltron. PDX opted to copy it +10,000 ids away
 CROWS_1 = {x: x + 10000 for x in range(2601, 2635 + 1)}
 # This isn't overwritten but PDX adjusted anyway
@@ -642,9 +791,9 @@ async def await_and_remove(bot, react_msg, listen_user, delete_msgs=None, emoji=
 loop_executor = concurrent.futures.ThreadPoolExecutor(max_workers=1)
 
 
-async def run_in_loop(bot, task, *args):
+async def run_in_loop(bot, task, *args, executor=None):
     event_loop = asyncio.get_event_loop()
-    running_task = event_loop.run_in_executor(loop_executor, task, *args)
+    running_task = event_loop.run_in_executor(executor or loop_executor, task, *args)
     return await running_task
 
 
@@ -0,0 +1,102 @@
+"""
+Tests for the Dadguide cog.
+
+They import it from the bot's cogs folder, so run them from the bot's folder, e.g.:
+
+    python -m unittest discover -s path/to/rpad-cogs/tests
+"""
+import difflib
+import os
+import random
+import sqlite3
+import tempfile
+import unittest
+
+from cogs import dadguide
+
+FUZZY_CUTOFFS = (.1, .3, .5, .6, .7, .8, .9, 1)
+
+
+class FuzzyMatcherTest(unittest.TestCase):
+    def assertSameAsDifflib(self, keys, queries):
+        matcher = dadguide.FuzzyMatcher(keys)
+        for query in queries:
+            for cutoff in FUZZY_CUTOFFS:
+                close_matches = difflib.get_close_matches(query, keys, n=1, cutoff=cutoff)
+                expected = close_matches[0] if close_matches else None
+                self.assertEqual(matcher.closest(query, cutoff), expected, (query, cutoff))
+
+    def test_repeated_bigrams(self):
+        # The bigram prefilter used to skip these
+        keys = ['lalalalalalb', 'momomomomomo', 'kokokokokoro', 'zazazazazaza']
+        queries = ['lalalalalala', 'momomomomomom', 'kokokokokoko', 'zazazazazazb']
+        self.assertSameAsDifflib(keys, queries)
+
+    def test_random_strings(self):
+        rng = random.Random(0)
+
+        def random_string():
+            return ''.join(rng.choice('abc ') for _ in range(rng.randint(0, 12)))
+
+        keys = [random_string() for _ in range(200)]
+        queries = [random_string() for _ in range(50)]
+        self.assertSameAsDifflib(keys, queries)
+
+    def test_low_cutoffs_scan_everything(self):
+        for query in ('a', 'abcd', 'abcdefghij', 'aaaaaaaaaa'):
+            self.assertEqual(dadguide.min_shared_bigrams(query, .5), 0)
+
+
+class EvolutionClosureTest(unittest.TestCase):
+    TABLES = {
+        'monsters': 'monster_id, level, limit_mult, hp_min, hp_max, hp_scale, atk_min, atk_max, '
+                    'atk_scale, rcv_min, rcv_max, rcv_scale, pal_egg, rem_egg, buy_mp, '
+                    'active_skill_id, series_id',
+        'evolutions': 'evolution_id, evolution_type, from_id, to_id, '
+                      'mat_1_id, mat_2_id, mat_3_id, mat_4_id, mat_5_id',
+        'awakenings': 'awakening_id, monster_id, order_idx',
+        'active_skills': 'active_skill_id',
+        'leader_skills': 'leader_skill_id',
+        'awoken_skills': 'awoken_skill_id',
+        'series': 'series_id',
+        'dungeons': 'dungeon_id',
+        'encounters': 'encounter_id, dungeon_id',
+        'drops': 'drop_id, encounter_id, monster_id',
+    }
+
+    def load_database(self, evolutions):
+        """A database of monsters 1-4 with the given (from_id, to_id) evolutions, in table order."""
+        fd, data_file = tempfile.mkstemp(suffix='.sqlite')
+        os.close(fd)
+        self.addCleanup(os.remove, data_file)
+        con = sqlite3.connect(data_file)
+        for table, columns in self.TABLES.items():
+            con.execute('CREATE TABLE {} ({})'.format(table, columns))
+        for monster_id in range(1, 5):
+            con.execute('INSERT INTO monsters VALUES (?, 99, 0, 1, 1, 1, 1, 1, 1, 1, 1, 1, '
+                        '0, 0, NULL, NULL, NULL)', (monster_id,))
+        for evolution_id, (from_id, to_id) in enumerate(evolutions, 1):
+            con.execute('INSERT INTO evolutions VALUES (?, 1, ?, ?, NULL, NULL, NULL, NULL, NULL)',
+                        (evolution_id, from_id, to_id))
+        con.commit()
+        con.close()
+
+        database = dadguide.DadguideDatabase(data_file=data_file)
+        self.addCleanup(database.close)
+        return database
+
+    def test_multiple_parents(self):
+        # 2 evolves from both 1 and 3; its base comes from the first evolution listed into it,
+        # like walking get_prev_evolution_by_monster, whatever order the trees are built in
+        for evolutions, base_id in (([(1, 2), (3, 2), (2, 4)], 1),
+                                    ([(3, 2), (1, 2), (2, 4)], 3)):
+            database = self.load_database(evolutions)
+            self.assertEqual(database.get_base_monster_id(2), base_id)
+            self.assertEqual(database.get_base_monster_id(4), base_id)
+            self.assertEqual(database.get_evolution_depth(4), 2)
+            self.assertEqual(database.get_evolution_tree_ids(1), [1, 2, 4])
+            self.assertEqual(database.get_evolution_tree_ids(3), [3, 2, 4])
+
+
+if __name__ == '__main__':
+    unittest.main()
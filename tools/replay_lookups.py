@@ -0,0 +1,139 @@
+"""
+Replays recorded ^id/^id2 lookups against a MonsterIndex built from a Dadguide database.
+
+Prints latency percentiles for each match tier and lists the lookups that now resolve to a
+different monster, exiting with 1 if there are any. Run it before and after an index change.
+
+With --check-fuzzy it also checks that FuzzyMatcher finds the same close matches as
+difflib.get_close_matches for every lookup, at each cutoff ^dadguide setfuzzycutoffs allows.
+
+It doesn't need a running bot, just its cogs folder. Run it from the bot's folder, e.g.:
+
+    python path/to/rpad-cogs/tools/replay_lookups.py data/dadguide/dadguide.sqlite \\
+        data/padinfo/historic_lookups.json
+"""
+import argparse
+import difflib
+import importlib
+import json
+import os
+import re
+import sys
+import time
+from collections import defaultdict
+
+import prettytable
+
+FUZZY_CUTOFFS = (.1, .3, .5, .6, .7, .8, .9, 1)
+
+
+def replay_lookups(find_fn, lookups: dict):
+    """Rerun find_fn over recorded {query: monster id} lookups (-1 for no match).
+
+    Returns the sorted latencies of the lookups for each match tier, and the
+    (query, recorded id, new id) of every lookup that now resolves differently.
+    """
+    tier_latencies = defaultdict(list)
+    changed = []
+    for query, recorded_id in lookups.items():
+        start = time.perf_counter()
+        nm, err, debug_info = find_fn(query)
+        tier_latencies[lookup_tier(nm, debug_info)].append(time.perf_counter() - start)
+
+        monster_id = nm.monster_id if nm else -1
+        if monster_id != recorded_id:
+            changed.append((query, recorded_id, monster_id))
+
+    for latencies in tier_latencies.values():
+        latencies.sort()
+    return tier_latencies, changed
+
+
+def replay_report(lookup_type: str, lookups: dict, tier_latencies: dict, changed: list):
+    msg = 'Replayed {} {} lookups\n\n'.format(len(lookups), lookup_type)
+    tbl = prettytable.PrettyTable(['Tier', 'Count', 'p50 ms', 'p95 ms', 'p99 ms'])
+    tbl.align['Tier'] = 'l'
+    for tier, latencies in sorted(tier_latencies.items(), key=lambda x: -len(x[1])):
+        tbl.add_row([tier, len(latencies)] + ['{:.2f}'.format(percentile(latencies, p) * 1000)
+                                              for p in (50, 95, 99)])
+    msg += tbl.get_string()
+    msg += '\n\n{} lookups resolved to a different monster'.format(len(changed))
+    for query, recorded_id, monster_id in changed:
+        msg += '\n\t{}: {} -> {}'.format(query, recorded_id, monster_id)
+    return msg
+
+
+def lookup_tier(nm, debug_info):
+    if nm is None:
+        return 'No match'
+    if debug_info is None:
+        # find_monster2 only explains matches it hands off to find_monster
+        return 'Prefix match'
+    # Strip the match details, e.g. 'Nickname prefix, max of 3' or 'Close name match (foo)'
+    return re.split(r'[,(]', debug_info, 1)[0].strip()
+
+
+def percentile(sorted_values: list, p: int):
+    index = min(len(sorted_values) - 1, int(len(sorted_values) * p / 100))
+    return sorted_values[index]
+
+
+def check_fuzzy(matcher, queries):
+    """Get the (query, cutoff, ours, difflib's) of every query the matcher gets wrong."""
+    mismatches = []
+    for query in queries:
+        for cutoff in FUZZY_CUTOFFS:
+            match = matcher.closest(query, cutoff)
+            close_matches = difflib.get_close_matches(query, matcher.keys, n=1, cutoff=cutoff)
+            expected = close_matches[0] if close_matches else None
+            if match != expected:
+                mismatches.append((query, cutoff, match, expected))
+    return mismatches
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description='Replay recorded ^id/^id2 lookups against a Dadguide database.')
+    parser.add_argument('database', help='Dadguide sqlite file')
+    parser.add_argument('lookups', help='recorded lookups, e.g. data/padinfo/historic_lookups.json')
+    parser.add_argument('--id2', action='store_true',
+                        help='replay with find_monster2, for ^id2 lookups')
+    parser.add_argument('--overrides', default='data/dadguide',
+                        help='folder with nicknames.csv, basenames.csv and panthnames.csv')
+    parser.add_argument('--check-fuzzy', action='store_true',
+                        help='also compare the close nickname/name matches with difflib')
+    args = parser.parse_args()
+
+    # The cogs folder is a package in the bot's folder
+    sys.path.insert(0, os.getcwd())
+    dadguide = importlib.import_module('cogs.dadguide')
+
+    database = dadguide.DadguideDatabase(data_file=args.database, immutable=True)
+    override_files = [os.path.join(args.overrides, name + '.csv')
+                      for name in ('nicknames', 'basenames', 'panthnames')]
+    overrides = dadguide.load_override_files(*override_files)
+    index = dadguide.MonsterIndex(database, *overrides)
+
+    with open(args.lookups, encoding='utf-8') as f:
+        lookups = json.load(f)
+
+    find_fn = index.find_monster2 if args.id2 else index.find_monster
+    tier_latencies, changed = replay_lookups(find_fn, lookups)
+    print(replay_report('id2' if args.id2 else 'id', lookups, tier_latencies, changed))
+
+    mismatches = []
+    if args.check_fuzzy:
+        # Normalized the way find_monster does it before fuzzy matching
+        rmdiacritics = dadguide.rpadutils.rmdiacritics
+        queries = sorted(set(rmdiacritics(q).lower().strip() for q in lookups))
+        mismatches.extend(check_fuzzy(index.nickname_matcher, queries))
+        mismatches.extend(check_fuzzy(index.na_name_matcher, queries))
+        print('\n{} close matches differ from difflib'.format(len(mismatches)))
+        for query, cutoff, match, expected in mismatches:
+            print('\t{} at {}: {} instead of {}'.format(query, cutoff, match, expected))
+
+    return 1 if changed or mismatches else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())